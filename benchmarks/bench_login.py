@@ -0,0 +1,108 @@
+"""Login throughput and event-loop latency with inline vs offloaded bcrypt.
+
+Runs in-process against a small ASGI app that exposes the two ways of
+checking a password plus a trivial `/ping`. For each mode it keeps
+`--concurrency` logins in flight for `--duration` seconds while a probe
+pings once every 10ms, then reports login throughput and ping latency.
+
+    python -m benchmarks.bench_login --duration 5 --concurrency 8
+
+Needs the usual settings in the environment or `.env`.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from src.auth.utils import (
+    generate_passwd_hash,
+    get_hash_executor,
+    shutdown_hash_executor,
+    verify_passwd,
+    verify_passwd_async,
+)
+
+PASSWORD = "correct horse battery staple"
+HASH = generate_passwd_hash(PASSWORD)
+
+bench_app = FastAPI()
+
+
+@bench_app.post("/login/inline")
+async def login_inline():
+    return {"ok": verify_passwd(PASSWORD, HASH)}
+
+
+@bench_app.post("/login/offloaded")
+async def login_offloaded():
+    return {"ok": await verify_passwd_async(PASSWORD, HASH)}
+
+
+@bench_app.get("/ping")
+async def ping():
+    return {}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run_mode(mode: str, duration: float, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=bench_app)
+    deadline = time.perf_counter() + duration
+    logins = 0
+    ping_latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def login_worker():
+            nonlocal logins
+            while time.perf_counter() < deadline:
+                response = await client.post(f"/login/{mode}")
+                response.raise_for_status()
+                logins += 1
+
+        async def probe():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/ping")
+                ping_latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(probe(), *[login_worker() for _ in range(concurrency)])
+
+    return {
+        "mode": mode,
+        "logins_per_s": logins / duration,
+        "ping_p50_ms": statistics.median(ping_latencies),
+        "ping_p99_ms": percentile(ping_latencies, 99),
+        "pings": len(ping_latencies),
+    }
+
+
+async def main(duration: float, concurrency: int) -> None:
+    # start the worker processes outside the measured window
+    await asyncio.get_running_loop().run_in_executor(get_hash_executor(), verify_passwd, PASSWORD, HASH)
+
+    print(f"{'mode':<10} {'logins/s':>9} {'ping p50 ms':>12} {'ping p99 ms':>12} {'pings':>6}")
+    for mode in ("inline", "offloaded"):
+        r = await run_mode(mode, duration, concurrency)
+        print(
+            f"{r['mode']:<10} {r['logins_per_s']:>9.1f} {r['ping_p50_ms']:>12.2f} "
+            f"{r['ping_p99_ms']:>12.2f} {r['pings']:>6}"
+        )
+
+    shutdown_hash_executor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.duration, args.concurrency))
@@ -0,0 +1,112 @@
+"""Email throughput: a fresh SMTP session per message vs the pooled pipeline.
+
+Starts a local SMTP sink that accepts and discards everything, so it runs
+offline. `--latency` delays every server reply to stand in for the network
+round trip, and `--handshake` delays the greeting to stand in for TLS and
+login, which a real server would add on every new session.
+
+    python -m benchmarks.bench_mail --messages 500 --latency 5 --handshake 50
+
+Needs the usual settings in the environment or `.env`; the mail settings
+are overridden to point at the sink.
+"""
+import argparse
+import asyncio
+import time
+
+import aiosmtplib
+
+from src.mail import DomainRateLimiter, SMTPPool, build_message, deliver
+
+HOST = "127.0.0.1"
+
+
+class SMTPSink:
+    """Just enough of an SMTP server to accept mail and count it"""
+
+    def __init__(self, latency: float, handshake: float) -> None:
+        self.latency = latency
+        self.handshake = handshake
+        self.received = 0
+        self.sessions = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.sessions += 1
+
+        async def reply(line: str) -> None:
+            await asyncio.sleep(self.latency)
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        await asyncio.sleep(self.handshake)
+        await reply("220 sink ESMTP")
+
+        while line := await reader.readline():
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                await reply("250 sink")
+            elif command == b"DATA":
+                await reply("354 end with <CRLF>.<CRLF>")
+                while (await reader.readline()) != b".\r\n":
+                    pass
+                self.received += 1
+                await reply("250 queued")
+            elif command == b"QUIT":
+                await reply("221 bye")
+                break
+            else:
+                await reply("250 ok")
+
+        writer.close()
+
+
+async def fresh_sessions(port: int, recipients: list) -> None:
+    # what the old task did: a new session for every send
+    for recipient in recipients:
+        await aiosmtplib.send(
+            build_message(recipient, "Benchmark", "<p>hello</p>"),
+            hostname=HOST, port=port, start_tls=False,
+        )
+
+
+async def pooled(port: int, recipients: list, pool_size: int) -> None:
+    pool = SMTPPool(size=pool_size, idle_timeout=60, hostname=HOST, port=port, start_tls=False)
+    limiter = DomainRateLimiter(rate=1_000_000, burst=1_000_000)
+
+    retry, rejected = await deliver(recipients, "Benchmark", "<p>hello</p>", pool, limiter)
+    assert not retry and not rejected, (retry, rejected)
+
+    await pool.close()
+
+
+async def main(messages: int, latency_ms: float, handshake_ms: float, pool_size: int) -> None:
+    recipients = [f"reader{i}@domain{i % 20}.example" for i in range(messages)]
+
+    for label, run in (
+        ("fresh session per message", lambda port: fresh_sessions(port, recipients)),
+        (f"pooled, {pool_size} sessions", lambda port: pooled(port, recipients, pool_size)),
+    ):
+        sink = SMTPSink(latency_ms / 1000, handshake_ms / 1000)
+        server = await asyncio.start_server(sink.handle, HOST, 0)
+        port = server.sockets[0].getsockname()[1]
+
+        start = time.perf_counter()
+        await run(port)
+        elapsed = time.perf_counter() - start
+
+        server.close()
+        print(
+            f"{label:<28} {sink.received / elapsed:>9.1f} msg/s "
+            f"({sink.received} messages over {sink.sessions} sessions in {elapsed:.2f}s)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=5.0, help="ms added to every reply")
+    parser.add_argument("--handshake", type=float, default=50.0, help="ms added to every new session")
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.messages, args.latency, args.handshake, args.pool_size))
@@ -0,0 +1,80 @@
+"""Search latency as the catalogue grows.
+
+For every size the tables are emptied and reseeded inside a transaction
+that is rolled back afterwards, then each query in QUERIES runs through
+`BookService.search_books` and its p50/p95 latency is printed.
+
+    python -m benchmarks.bench_search --sizes 10000 50000 200000 --repeat 30
+
+Needs a DATABASE_URL pointing at a local, migrated Postgres. The tables
+are truncated (and locked) for the duration of each size, so never point
+it at a shared database.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.seed import seed
+from src.books.service import BookService
+from src.config import Config
+from src.pagination import PageParams
+
+# (label, query, language); seeded titles end in the book's number, authors
+# in n % 5000 and publishers in n % 300, so author 42 is always Theo Marlowe
+# and publisher 7 always Crystal Words (see benchmarks/seed.py)
+QUERIES = [
+    ("one author", '"Marlowe 42"', None),
+    ("one author, one language", '"Marlowe 42"', "Japanese"),
+    ("publisher", '"Crystal Words 7"', None),
+    ("title or author", "4200 or 42", None),
+    ("two books in five", "the", None),
+]
+
+TABLES = "booktag, reviews, books, tags, users"
+
+
+async def time_query(session: AsyncSession, query: str, language, repeat: int) -> tuple:
+    service = BookService()
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        page = await service.search_books(query, session, PageParams(cursor=None, limit=20), language)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1], len(page.items)
+
+
+async def main(sizes: list, repeat: int) -> None:
+    engine = create_async_engine(Config.DATABASE_URL)
+
+    async with engine.connect() as conn:
+        for size in sizes:
+            await conn.execute(text(f"TRUNCATE {TABLES}"))
+            await seed(conn, size, commit=False)
+
+            session = AsyncSession(bind=conn)
+            print(f"{size} books")
+            for label, query, language in QUERIES:
+                p50, p95, found = await time_query(session, query, language, repeat)
+                print(f"  {label:<26} p50 {p50:>8.2f} ms  p95 {p95:>8.2f} ms  ({found} on first page)")
+            await session.close()
+
+            await conn.rollback()
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.sizes, args.repeat))
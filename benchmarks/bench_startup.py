@@ -0,0 +1,127 @@
+"""Cold start of a worker, with and without the startup warm-up.
+
+Every run is a fresh interpreter, as a new replica would be. It times
+importing the app, the lifespan's startup, and a burst of `--concurrency`
+requests to the hot routes (book list, book detail, tag list) sent the
+moment startup returns, then the same burst again once everything is
+open. Prints the median of `--runs` runs for each mode.
+
+    python -m benchmarks.bench_startup --runs 5 --concurrency 8
+
+Needs DATABASE_URL and REDIS_URL pointing at a seeded database and a
+Redis, and the usual settings in the environment or `.env`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# WARMUP_ENABLED for each mode
+MODES = {"cold": "false", "warmed": "true"}
+COLUMNS = ("import_ms", "startup_ms", "first_p50_ms", "first_max_ms", "warm_p50_ms", "warm_max_ms", "served_ms")
+
+
+async def burst(client, book_uid: str, token: str, concurrency: int) -> list:
+    urls = ["/api/v1/books/", f"/api/v1/books/{book_uid}", "/api/v1/tags/"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def timed(url: str) -> float:
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
+        return (time.perf_counter() - start) * 1000
+
+    return await asyncio.gather(*[timed(urls[i % len(urls)]) for i in range(concurrency)])
+
+
+async def run_child(book_uid: str, concurrency: int) -> dict:
+    started = time.perf_counter()
+    from src import app
+    imported = time.perf_counter()
+
+    from types import SimpleNamespace
+    import uuid
+
+    import httpx
+    from src.auth.utils import create_access_token, user_claims
+
+    user = SimpleNamespace(uid=uuid.uuid4(), email="bench@example.com", role="user", is_verified=True)
+    token = create_access_token(user_claims(user, 0))
+
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            first = await burst(client, book_uid, token, concurrency)
+            served = time.perf_counter()
+            again = await burst(client, book_uid, token, concurrency)
+
+    return {
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "first_p50_ms": statistics.median(first),
+        "first_max_ms": max(first),
+        "warm_p50_ms": statistics.median(again),
+        "warm_max_ms": max(again),
+        # from importing the app to having answered the whole first burst
+        "served_ms": (served - started) * 1000,
+    }
+
+
+async def newest_book() -> str:
+    from sqlalchemy import text
+    from src.db.main import async_engine
+
+    async with async_engine.connect() as conn:
+        book_uid = await conn.scalar(text("SELECT uid FROM books ORDER BY created_at DESC, uid DESC LIMIT 1"))
+    await async_engine.dispose()
+
+    return str(book_uid)
+
+
+async def forget_detail(book_uid: str) -> None:
+    # every run should build the detail itself rather than read the last run's
+    from src.cache import book_detail_cache
+    from src.db.redis import redis_client
+
+    await book_detail_cache.invalidate(book_uid)
+    await redis_client.aclose()
+
+
+def main(runs: int, concurrency: int) -> None:
+    book_uid = asyncio.run(newest_book())
+    print(f"{'mode':<8} " + " ".join(f"{column:>13}" for column in COLUMNS))
+
+    for mode, warmup in MODES.items():
+        results = []
+        for _ in range(runs):
+            asyncio.run(forget_detail(book_uid))
+            child = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--child", book_uid, "--concurrency", str(concurrency)],
+                env={**os.environ, "WARMUP_ENABLED": warmup},
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            # the app logs to stdout too; the result is the last line
+            results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+        medians = [statistics.median(result[column] for result in results) for column in COLUMNS]
+        print(f"{mode:<8} " + " ".join(f"{value:>13.1f}" for value in medians))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--child", metavar="BOOK_UID", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_child(args.child, args.concurrency))))
+    else:
+        main(args.runs, args.concurrency)
@@ -0,0 +1,136 @@
+"""EXPLAIN ANALYZE the service queries with and without the query indexes.
+
+Each query is planned twice in one run: once inside a transaction that
+drops the indexes added by migration 5a1d711dc116 (rolled back afterwards)
+and once against the migrated schema. Prints the scan nodes and the
+execution time of each plan.
+
+    python -m benchmarks.seed --books 200000
+    python -m benchmarks.explain_queries
+
+Needs a DATABASE_URL pointing at a local, migrated and seeded Postgres.
+Dropping the indexes takes exclusive locks, so never point it at a
+shared database.
+"""
+import asyncio
+import importlib.util
+import json
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from src.config import Config
+
+MIGRATION = Path(__file__).resolve().parent.parent / "migrations/versions/5a1d711dc116_add_query_indexes.py"
+
+# the statements the services issue, with the parameters they bind
+QUERIES = {
+    "books first page": """
+        SELECT * FROM books ORDER BY created_at DESC, uid DESC LIMIT 21
+    """,
+    "books keyset page": """
+        SELECT * FROM books WHERE (created_at, uid) < (:created_at, :book_uid)
+        ORDER BY created_at DESC, uid DESC LIMIT 21
+    """,
+    "user books page": """
+        SELECT * FROM books WHERE user_uid = :user_uid
+        ORDER BY created_at DESC, uid DESC LIMIT 21
+    """,
+    "book detail reviews": """
+        SELECT * FROM reviews WHERE book_uid IN (:book_uid)
+    """,
+    "reviews first page": """
+        SELECT * FROM reviews ORDER BY created_at DESC, uid DESC LIMIT 21
+    """,
+    "user by email": """
+        SELECT * FROM users WHERE email = :email
+    """,
+    "tag by name": """
+        SELECT * FROM tags WHERE name = :tag_name
+    """,
+    "tags first page": """
+        SELECT * FROM tags ORDER BY created_at DESC, uid DESC LIMIT 21
+    """,
+}
+
+
+def load_migration():
+    spec = importlib.util.spec_from_file_location("query_indexes", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def sample_params(conn: AsyncConnection) -> dict:
+    book = (
+        await conn.execute(
+            text("SELECT uid, created_at, user_uid FROM books ORDER BY created_at DESC OFFSET 1000 LIMIT 1")
+        )
+    ).one()
+    email = (await conn.execute(text("SELECT email FROM users OFFSET 100 LIMIT 1"))).scalar_one()
+    tag_name = (await conn.execute(text("SELECT name FROM tags OFFSET 10 LIMIT 1"))).scalar_one()
+
+    return {
+        "book_uid": book.uid,
+        "created_at": book.created_at,
+        "user_uid": book.user_uid,
+        "email": email,
+        "tag_name": tag_name,
+    }
+
+
+def scan_nodes(plan: dict) -> list:
+    nodes = []
+    if "Scan" in plan["Node Type"]:
+        target = plan.get("Index Name") or plan.get("Relation Name")
+        nodes.append(f"{plan['Node Type']}({target})")
+    for child in plan.get("Plans", []):
+        nodes.extend(scan_nodes(child))
+    return nodes
+
+
+async def explain(conn: AsyncConnection, sql: str, params: dict) -> tuple:
+    result = await conn.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql), params)
+    raw = result.scalar_one()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+
+    return ", ".join(scan_nodes(plan["Plan"])), plan["Execution Time"]
+
+
+async def main() -> None:
+    migration = load_migration()
+    engine = create_async_engine(Config.DATABASE_URL)
+    results = {name: {} for name in QUERIES}
+
+    async with engine.connect() as conn:
+        params = await sample_params(conn)
+        await conn.rollback()
+
+        # without indexes: drop them in a transaction that is rolled back
+        for name, table, _ in migration.UNIQUE_CONSTRAINTS:
+            await conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}"))
+        for name, _, _ in migration.INDEXES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+        for name, sql in QUERIES.items():
+            results[name]["before"] = await explain(conn, sql, params)
+
+        await conn.rollback()
+
+        for name, sql in QUERIES.items():
+            results[name]["after"] = await explain(conn, sql, params)
+
+        await conn.rollback()
+
+    await engine.dispose()
+
+    for name, result in results.items():
+        (before_plan, before_ms), (after_plan, after_ms) = result["before"], result["after"]
+        print(f"{name}")
+        print(f"  before {before_ms:>10.3f} ms  {before_plan}")
+        print(f"  after  {after_ms:>10.3f} ms  {after_plan}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,229 @@
+"""HTTP load test of the real app against a seeded Postgres and Redis.
+
+`--concurrency` virtual users each log in as a seeded reader, then loop
+for `--duration` seconds, picking their next request from a scenario mix.
+The first `--warmup` seconds are not counted. Prints throughput and
+p50/p95/p99 latency for every route.
+
+    python -m benchmarks.seed --books 1000000
+    python -m benchmarks.loadtest --mix mixed --concurrency 50 --duration 60
+
+By default the app runs in this process behind httpx's ASGI transport, so
+nothing else needs starting; `--url` sends the traffic to a running
+server instead, e.g. uvicorn with several workers. A mix is one of MIXES
+or weights like `browse=70,detail=30`.
+
+Needs DATABASE_URL and REDIS_URL pointing at the seeded database and a
+Redis, and the usual settings in the environment or `.env`. The review
+and tag scenarios write, so never point it at a shared database.
+
+Every virtual user comes from the same address, so rate limiting is
+switched off in-process; start a server under test with
+RATE_LIMIT_ENABLED=false.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks.seed import SEED_PASSWORD
+from src.db.main import async_engine
+
+API = "/api/v1"
+SORTS = ("newest", "most_reviewed", "top_rated")
+
+MIXES = {
+    "browse": {"browse": 60, "detail": 40},
+    "mixed": {"browse": 35, "detail": 45, "login": 5, "review": 10, "tag": 5},
+    "write": {"review": 70, "tag": 30},
+}
+
+
+class Target:
+    """What the virtual users share: the client, sample ids and the results"""
+
+    def __init__(self, client: httpx.AsyncClient, books: List[str], emails: List[str], tags: List[str]) -> None:
+        self.client = client
+        self.books = books
+        self.emails = emails
+        self.tags = tags
+        self.recording = False
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def book(self) -> str:
+        # a fifth of the books get four fifths of the detail traffic, so
+        # the cache sees a realistic mix of hot and cold entries
+        hot = self.books[: max(len(self.books) // 5, 1)]
+        return random.choice(hot if random.random() < 0.8 else self.books)
+
+    async def request(self, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        elapsed = time.perf_counter() - start
+
+        if self.recording:
+            self.latencies[route].append(elapsed * 1000)
+            if response is None or response.status_code >= 400:
+                self.errors[route] += 1
+
+        return response
+
+
+class VirtualUser:
+    def __init__(self, target: Target) -> None:
+        self.target = target
+        self.headers: Dict[str, str] = {}
+        self.cursor: Optional[str] = None
+        self.sort = random.choice(SORTS)
+
+    async def login(self) -> None:
+        response = await self.target.request(
+            f"POST {API}/auth/login",
+            "POST",
+            f"{API}/auth/login",
+            json={"email": random.choice(self.target.emails), "password": SEED_PASSWORD},
+        )
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def browse(self) -> None:
+        # keep paging through one listing two times in three, else start over
+        if self.cursor is None or random.random() < 1 / 3:
+            self.cursor, self.sort = None, random.choice(SORTS)
+
+        params = {"limit": 20, "sort": self.sort}
+        if self.cursor:
+            params["cursor"] = self.cursor
+        response = await self.target.request(
+            f"GET {API}/books/", "GET", f"{API}/books/", params=params, headers=self.headers
+        )
+        self.cursor = response.json().get("next_cursor") if response is not None and response.is_success else None
+
+    async def detail(self) -> None:
+        await self.target.request(
+            f"GET {API}/books/{{book_uid}}", "GET", f"{API}/books/{self.target.book()}", headers=self.headers
+        )
+
+    async def review(self) -> None:
+        await self.target.request(
+            f"POST {API}/reviews/book/{{book_uid}}",
+            "POST",
+            f"{API}/reviews/book/{self.target.book()}",
+            json={"rating": random.randint(0, 4), "review_text": "Load test review"},
+            headers=self.headers,
+        )
+
+    async def tag(self) -> None:
+        await self.target.request(
+            f"POST {API}/tags/book/{{book_uid}}/tags",
+            "POST",
+            f"{API}/tags/book/{self.target.book()}/tags",
+            json={"tags": [{"name": random.choice(self.target.tags)}]},
+            headers=self.headers,
+        )
+
+    async def run(self, mix: Dict[str, int], deadline: float) -> None:
+        scenarios = [getattr(self, name) for name in mix]
+        weights = list(mix.values())
+
+        await self.login()
+        while time.perf_counter() < deadline:
+            await random.choices(scenarios, weights)[0]()
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    if value in MIXES:
+        return MIXES[value]
+
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("browse", "detail", "login", "review", "tag"):
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def sample_ids(limit: int) -> tuple:
+    async with async_engine.connect() as conn:
+        books = (await conn.execute(
+            text("SELECT uid::text FROM books TABLESAMPLE SYSTEM (5) LIMIT :limit"), {"limit": limit}
+        )).scalars().all()
+        emails = (await conn.execute(
+            text("SELECT email FROM users WHERE email LIKE '%@seed.example' LIMIT :limit"), {"limit": limit}
+        )).scalars().all()
+        tags = (await conn.execute(text("SELECT name FROM tags LIMIT :limit"), {"limit": limit})).scalars().all()
+
+    if not books or not emails:
+        raise SystemExit("no seeded books or users; run `python -m benchmarks.seed` first")
+
+    random.shuffle(books)
+    return books, emails, tags
+
+
+def report(target: Target, measured: float) -> None:
+    total = sum(len(samples) for samples in target.latencies.values())
+    print(f"{'route':<42} {'req':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, samples in sorted(target.latencies.items()):
+        print(
+            f"{route:<42} {len(samples):>7} {target.errors[route]:>5} {len(samples) / measured:>8.1f} "
+            f"{percentile(samples, 50):>8.2f} {percentile(samples, 95):>8.2f} {percentile(samples, 99):>8.2f}"
+        )
+    print(f"{'total':<42} {total:>7} {sum(target.errors.values()):>5} {total / measured:>8.1f}")
+
+
+async def main(mix: Dict[str, int], concurrency: int, duration: float, warmup: float, url: Optional[str]) -> None:
+    books, emails, tags = await sample_ids(10_000)
+
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=30)
+    else:
+        from src import app
+        from src.config import Config
+
+        # one access log line per request would drown the report
+        logging.getLogger("bookworm").setLevel(logging.WARNING)
+        Config.RATE_LIMIT_ENABLED = False
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost", timeout=30)
+
+    async with client:
+        target = Target(client, books, emails, tags)
+        users = [VirtualUser(target) for _ in range(concurrency)]
+
+        deadline = time.perf_counter() + warmup + duration
+        runs = asyncio.gather(*[user.run(mix, deadline) for user in users])
+
+        await asyncio.sleep(warmup)
+        target.recording = True
+        started = time.perf_counter()
+        await runs
+
+    report(target, time.perf_counter() - started)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", type=parse_mix, default="mixed", help=f"one of {', '.join(MIXES)} or name=weight,...")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--url", help="base URL of a running server; defaults to the app in-process")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.mix, args.concurrency, args.duration, args.warmup, args.url))
@@ -0,0 +1,197 @@
+"""Seed a local Postgres with a synthetic catalogue.
+
+The data is generated inside Postgres with generate_series, so seeding a
+few hundred thousand books takes seconds and millions take minutes.
+Sizes scale off `books`: one user per 50 books, three reviews per book,
+one tag per 500 books and two tags per book. Titles, authors, publishers
+and languages are variations on the sample records in
+`src/books/in_mem_db.py`.
+
+Books go in `--batch-size` at a time, each batch with its reviews, tags,
+rating counters and search vectors in its own transaction, so a large
+seed never holds one huge transaction open.
+
+Every seeded user is `user<i>@seed.example` with the password
+SEED_PASSWORD, so the load test can log in as any of them.
+
+    python -m benchmarks.seed --books 2000000
+
+Needs a DATABASE_URL whose schema is already migrated. Existing rows are
+left alone, so run it against a throwaway database.
+"""
+import argparse
+import asyncio
+from datetime import date
+import time
+
+from sqlalchemy import column, select, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from src.auth.utils import generate_passwd_hash
+from src.books.in_mem_db import in_mem_book_db
+from src.books.search import matching_books, update_search_vectors
+from src.config import Config
+
+SEED_PASSWORD = "seeded-reader-password"
+REVIEWS_PER_BOOK = 3
+
+SETUP_STATEMENTS = [
+    """
+    INSERT INTO users (uid, username, email, first_name, last_name, role, is_verified,
+                       password_hash, created_at, updated_at)
+    SELECT gen_random_uuid(), 'user' || i, 'user' || i || '@seed.example', 'Seed', 'User',
+           'user', true, :password_hash, now() - i * interval '1 minute', now()
+    FROM generate_series(1, :users) AS i
+    """,
+    """
+    INSERT INTO tags (uid, name, created_at)
+    SELECT gen_random_uuid(), 'tag-' || i, now() - i * interval '1 minute'
+    FROM generate_series(1, :tags) AS i
+    """,
+    # numbered copies of the seeded users and tags, so every batch can pick
+    # its authors, reviewers and tags by arithmetic on an index
+    """
+    CREATE TEMP TABLE seed_users AS
+    SELECT uid, row_number() OVER (ORDER BY created_at DESC, uid) - 1 AS un
+    FROM users WHERE email LIKE '%@seed.example'
+    """,
+    "CREATE UNIQUE INDEX ON seed_users (un)",
+    """
+    CREATE TEMP TABLE seed_tags AS
+    SELECT uid, row_number() OVER (ORDER BY created_at DESC, uid) - 1 AS tn
+    FROM tags WHERE name LIKE 'tag-%'
+    """,
+    "CREATE UNIQUE INDEX ON seed_tags (tn)",
+    "CREATE TEMP TABLE seed_batch (i int PRIMARY KEY, uid uuid, created_at timestamp, sample int)",
+]
+
+BATCH_STATEMENTS = [
+    "TRUNCATE seed_batch",
+    """
+    INSERT INTO seed_batch (i, uid, created_at, sample)
+    SELECT i, gen_random_uuid(), now() - i * interval '1 second', 1 + i % :samples
+    FROM generate_series(CAST(:first AS int), CAST(:last AS int)) AS i
+    """,
+    "ANALYZE seed_batch",
+    """
+    INSERT INTO books (uid, title, author, publisher, published_date, page_count, language,
+                       user_uid, created_at, updated_at)
+    SELECT b.uid,
+           (CAST(:titles AS text[]))[b.sample] || ' ' || b.i,
+           (CAST(:authors AS text[]))[b.sample] || ' ' || (b.i % 5000),
+           (CAST(:publishers AS text[]))[b.sample] || ' ' || (b.i % 300),
+           CAST(:first_published AS date) + (b.i % 9000),
+           (CAST(:page_counts AS int[]))[b.sample] + (b.i % 400),
+           (CAST(:languages AS text[]))[1 + b.i % cardinality(CAST(:languages AS text[]))],
+           u.uid, b.created_at, now()
+    FROM seed_batch b JOIN seed_users u ON u.un = b.i % :users
+    """,
+    """
+    INSERT INTO reviews (uid, rating, review_text, user_uid, book_uid, created_at, update_at)
+    SELECT gen_random_uuid(), (random() * 4)::int, 'Seeded review', u.uid, b.uid,
+           b.created_at + n * interval '1 hour', now()
+    FROM seed_batch b
+    CROSS JOIN generate_series(1, :reviews_per_book) AS n
+    JOIN seed_users u ON u.un = (b.i * 31 + n) % :users
+    """,
+    """
+    INSERT INTO booktag (book_id, tag_id)
+    SELECT DISTINCT b.uid, t.uid
+    FROM seed_batch b
+    CROSS JOIN generate_series(0, 1) AS n
+    JOIN seed_tags t ON t.tn = (b.i * 7 + n * 13) % :tags
+    """,
+    # the search vectors look tags up per book; stale statistics on a
+    # table that just grew make the planner scan it instead
+    "ANALYZE booktag, reviews",
+    """
+    UPDATE books SET
+        review_count = counts.review_count,
+        rating_sum = counts.rating_sum,
+        average_rating = counts.rating_sum::float8 / counts.review_count,
+        rating_histogram = counts.rating_histogram
+    FROM (
+        SELECT book_uid, sum(n)::int AS review_count, sum(rating * n)::int AS rating_sum,
+               jsonb_object_agg(rating::text, n) AS rating_histogram
+        FROM (
+            SELECT r.book_uid, r.rating, count(*) AS n
+            FROM reviews r JOIN seed_batch b ON r.book_uid = b.uid
+            GROUP BY r.book_uid, r.rating
+        ) stars
+        GROUP BY book_uid
+    ) counts
+    WHERE books.uid = counts.book_uid
+    """,
+]
+
+
+def sizes(books: int) -> dict:
+    return {"books": books, "users": max(books // 50, 1), "tags": max(books // 500, 2)}
+
+
+def sample_params() -> dict:
+    return {
+        "samples": len(in_mem_book_db),
+        "titles": [book["title"] for book in in_mem_book_db],
+        "authors": [book["author"] for book in in_mem_book_db],
+        "publishers": [book["publisher"] for book in in_mem_book_db],
+        "page_counts": [book["page_count"] for book in in_mem_book_db],
+        "languages": sorted({book["language"].capitalize() for book in in_mem_book_db}),
+        "first_published": min(date.fromisoformat(book["published_date"]) for book in in_mem_book_db),
+    }
+
+
+async def seed(conn: AsyncConnection, books: int, batch_size: int = 100_000, commit: bool = True) -> None:
+    """Seed `books` books and their users, reviews and tags.
+
+    With `commit=False` everything stays in the caller's transaction, for
+    benchmarks that roll the seed back afterwards.
+    """
+    params = {
+        **sizes(books),
+        **sample_params(),
+        "password_hash": generate_passwd_hash(SEED_PASSWORD),
+        "reviews_per_book": REVIEWS_PER_BOOK,
+    }
+
+    await conn.execute(text("SELECT setseed(0.42)"))
+    for statement in SETUP_STATEMENTS:
+        await conn.execute(text(statement), params)
+    await conn.execute(text("ANALYZE seed_users, seed_tags"))
+
+    batch = select(column("uid")).select_from(table("seed_batch"))
+    for first in range(1, books + 1, batch_size):
+        last = min(first + batch_size - 1, books)
+        started = time.perf_counter()
+
+        for statement in BATCH_STATEMENTS:
+            await conn.execute(text(statement), {**params, "first": first, "last": last})
+        await conn.execute(update_search_vectors(matching_books(batch)))
+        if commit:
+            await conn.commit()
+
+        print(f"books {first}-{last} in {time.perf_counter() - started:.1f}s")
+
+    await conn.execute(text("DROP TABLE seed_users, seed_tags, seed_batch"))
+    await conn.execute(text("ANALYZE"))
+    if commit:
+        await conn.commit()
+
+
+async def main(books: int, batch_size: int) -> None:
+    engine = create_async_engine(Config.DATABASE_URL)
+
+    async with engine.connect() as conn:
+        await seed(conn, books, batch_size)
+
+    await engine.dispose()
+    print(f"seeded {sizes(books)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.books, args.batch_size))
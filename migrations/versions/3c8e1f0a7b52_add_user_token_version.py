@@ -0,0 +1,66 @@
+"""add user token version
+
+Revision ID: 3c8e1f0a7b52
+Revises: 9036880130c2
+Create Date: 2026-10-18 17:05:12.284913
+
+"""
+from typing import Sequence, Union
+import uuid
+
+from alembic import op
+import redis
+import sqlalchemy as sa
+
+from src.config import Config
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8e1f0a7b52'
+down_revision: Union[str, Sequence[str], None] = '9036880130c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# spelled out rather than imported from src.db.redis so the migration
+# does not change when the application code does
+KEY_PREFIX = 'token_version:'
+
+COPY_VERSION = """
+    UPDATE users SET token_version = GREATEST(token_version, :version)
+    WHERE uid = CAST(:uid AS uuid)
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a constant default, so adding the column does not rewrite the table
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+    # the versions were only kept in Redis so far; without them the tokens
+    # they revoked would be valid again
+    client = redis.Redis.from_url(Config.REDIS_URL)
+    try:
+        client.ping()
+    except redis.RedisError as e:
+        raise RuntimeError(
+            f"token versions are copied from Redis at REDIS_URL, which is unavailable: {e}"
+        ) from e
+
+    connection = op.get_bind()
+    for key in client.scan_iter(match=f'{KEY_PREFIX}*', count=1000):
+        uid = key.decode()[len(KEY_PREFIX):]
+        version = client.get(key)
+        try:
+            uuid.UUID(uid)
+        except ValueError:
+            continue
+        # the keys are left alone: they hold what the column now does, and
+        # serve as its cache until the migration has committed
+        if version is not None:
+            connection.execute(sa.text(COPY_VERSION), {'uid': uid, 'version': int(version)})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,118 @@
+"""add query indexes
+
+Revision ID: 5a1d711dc116
+Revises: 19a3714ddc7b
+Create Date: 2026-10-18 09:12:40.511237
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a1d711dc116'
+down_revision: Union[str, Sequence[str], None] = '19a3714ddc7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (name, table, columns); each matches a filter or keyset sort in the services
+INDEXES = [
+    ('ix_books_created_at_uid', 'books', ['created_at', 'uid']),
+    ('ix_books_user_uid_created_at_uid', 'books', ['user_uid', 'created_at', 'uid']),
+    ('ix_reviews_book_uid', 'reviews', ['book_uid']),
+    ('ix_reviews_user_uid', 'reviews', ['user_uid']),
+    ('ix_reviews_created_at_uid', 'reviews', ['created_at', 'uid']),
+    ('ix_tags_created_at_uid', 'tags', ['created_at', 'uid']),
+    ('ix_booktag_tag_id', 'booktag', ['tag_id']),
+]
+
+# (constraint, table, column); built as a unique index first so the table
+# is never locked for the scan, then attached as a constraint
+UNIQUE_CONSTRAINTS = [
+    ('uq_users_email', 'users', 'email'),
+    ('uq_tags_name', 'tags', 'name'),
+]
+
+
+DUPLICATE_TAGS = """
+    SELECT uid, keep FROM (
+        SELECT uid, first_value(uid) OVER (PARTITION BY name ORDER BY created_at, uid) AS keep
+        FROM tags
+    ) ranked
+    WHERE uid <> keep
+"""
+
+DUPLICATE_EMAILS = """
+    SELECT email FROM users GROUP BY email HAVING count(*) > 1 ORDER BY email LIMIT 10
+"""
+
+# a failed CREATE INDEX CONCURRENTLY leaves an invalid index behind, which
+# IF NOT EXISTS would then take for the finished one
+INVALID_INDEX = """
+    SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+    WHERE pg_class.relname = :name AND NOT pg_index.indisvalid
+"""
+
+
+def _build_index(name: str, table: str, columns: list, unique: bool = False) -> None:
+    bind = op.get_bind()
+    if bind.execute(sa.text(INVALID_INDEX), {"name": name}).first():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+    op.create_index(
+        name, table, columns, unique=unique,
+        postgresql_concurrently=True, if_not_exists=True,
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # users.email becomes unique too, but which account to keep is not
+    # for a migration to decide
+    duplicates = [row.email for row in op.get_bind().execute(sa.text(DUPLICATE_EMAILS))]
+    if duplicates:
+        raise RuntimeError(
+            "users.email has duplicates, merge or remove them before upgrading: "
+            + ", ".join(duplicates)
+        )
+
+    # tags.name becomes unique: fold duplicate tags into the oldest one
+    op.execute(f"""
+        INSERT INTO booktag (book_id, tag_id)
+        SELECT booktag.book_id, dupes.keep
+        FROM booktag JOIN ({DUPLICATE_TAGS}) dupes ON booktag.tag_id = dupes.uid
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute(f"DELETE FROM booktag USING ({DUPLICATE_TAGS}) dupes WHERE booktag.tag_id = dupes.uid")
+    op.execute(f"DELETE FROM tags USING ({DUPLICATE_TAGS}) dupes WHERE tags.uid = dupes.uid")
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            _build_index(name, table, columns)
+
+        for name, table, column in UNIQUE_CONSTRAINTS:
+            _build_index(name, table, [column], unique=True)
+            # a rerun after a failure further on finds it attached already
+            if not op.get_bind().execute(
+                sa.text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": name}
+            ).first():
+                op.execute(
+                    f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}'
+                )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(UNIQUE_CONSTRAINTS):
+            op.drop_constraint(name, table, type_='unique')
+
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                postgresql_concurrently=True, if_exists=True,
+            )
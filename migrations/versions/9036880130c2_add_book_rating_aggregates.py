@@ -0,0 +1,103 @@
+"""add book rating aggregates
+
+Revision ID: 9036880130c2
+Revises: f6c50ca38f8f
+Create Date: 2026-10-18 16:20:48.130551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9036880130c2'
+down_revision: Union[str, Sequence[str], None] = 'f6c50ca38f8f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH_SIZE = 10_000
+
+INDEXES = [
+    ('ix_books_review_count_uid', 'books', ['review_count', 'uid']),
+    ('ix_books_average_rating_uid', 'books', ['average_rating', 'uid']),
+]
+
+# spelled out rather than imported from src.reviews.aggregates so the
+# migration does not change when the application code does
+BACKFILL = """
+    WITH batch AS (
+        SELECT uid FROM books
+        WHERE CAST(:after AS uuid) IS NULL OR uid > CAST(:after AS uuid)
+        ORDER BY uid LIMIT :batch_size
+    ),
+    stars AS (
+        SELECT reviews.book_uid, reviews.rating, count(*) AS n
+        FROM reviews JOIN batch ON reviews.book_uid = batch.uid
+        GROUP BY reviews.book_uid, reviews.rating
+    ),
+    actual AS (
+        SELECT stars.book_uid AS uid,
+               sum(stars.n)::int AS review_count,
+               sum(stars.rating * stars.n)::int AS rating_sum,
+               jsonb_object_agg(stars.rating::text, stars.n) AS rating_histogram
+        FROM stars
+        GROUP BY stars.book_uid
+    ),
+    filled AS (
+        UPDATE books SET
+            review_count = actual.review_count,
+            rating_sum = actual.rating_sum,
+            average_rating = actual.rating_sum::float8 / actual.review_count,
+            rating_histogram = actual.rating_histogram
+        FROM actual
+        WHERE books.uid = actual.uid
+    )
+    SELECT max(uid::text) FROM batch
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # constant defaults, so adding the columns does not rewrite the table
+    op.add_column('books', sa.Column('review_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('books', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('books', sa.Column('average_rating', sa.Float(), server_default='0', nullable=False))
+    op.add_column(
+        'books',
+        sa.Column('rating_histogram', postgresql.JSONB(), server_default='{}', nullable=False),
+    )
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        after = None
+        while True:
+            after = connection.execute(
+                sa.text(BACKFILL), {"after": after, "batch_size": BACKFILL_BATCH_SIZE}
+            ).scalar()
+            if after is None:
+                break
+
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                postgresql_concurrently=True, if_exists=True,
+            )
+
+    op.drop_column('books', 'rating_histogram')
+    op.drop_column('books', 'average_rating')
+    op.drop_column('books', 'rating_sum')
+    op.drop_column('books', 'review_count')
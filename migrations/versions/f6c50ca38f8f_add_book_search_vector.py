@@ -0,0 +1,67 @@
+"""add book search vector
+
+Revision ID: f6c50ca38f8f
+Revises: 5a1d711dc116
+Create Date: 2026-10-18 15:02:11.804127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6c50ca38f8f'
+down_revision: Union[str, Sequence[str], None] = '5a1d711dc116'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH_SIZE = 10_000
+
+# the same document src.books.search builds; spelled out so the migration
+# does not change when the application code does
+BACKFILL = f"""
+    UPDATE books SET search_vector =
+        setweight(to_tsvector('simple', coalesce(books.title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(books.author, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce((
+            SELECT string_agg(tags.name, ' ')
+            FROM tags JOIN booktag ON booktag.tag_id = tags.uid
+            WHERE booktag.book_id = books.uid
+        ), '')), 'C') ||
+        setweight(to_tsvector('simple', coalesce(books.publisher, '')), 'D')
+    WHERE books.uid IN (
+        SELECT uid FROM books WHERE search_vector IS NULL LIMIT {BACKFILL_BATCH_SIZE}
+    )
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('books', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # backfill and index outside one big transaction so row locks are
+    # short-lived and the GIN index is built without blocking writes
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        while connection.execute(sa.text(BACKFILL)).rowcount:
+            pass
+
+        op.create_index(
+            'ix_books_search_vector', 'books', ['search_vector'],
+            postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_books_search_vector', table_name='books',
+            postgresql_concurrently=True, if_exists=True,
+        )
+
+    op.drop_column('books', 'search_vector')
@@ -1,24 +1,17 @@
-from contextlib import asynccontextmanager
-
 from fastapi import FastAPI
 
-from src.db.main import init_db
+from src.config import Config
 from src.auth.routers import auth_router
 from src.books.routers import book_router
 from src.reviews.routers import review_router
 from src.tags.routers import tags_router
+from src.health.routers import health_router, metrics_router
+from src.resources import lifespan
+from src.log import configure_logging
 from .errors import register_all_errors
 from .middleware import register_middleware
 
 
-# @asynccontextmanager
-# async def life_span(app: FastAPI):
-#     print("server is starting..")
-#     await init_db()
-#     yield
-#     print("Server stopped!")
-
-
 description = """
 A REST API for a book review web service.
 
@@ -36,17 +29,20 @@ app = FastAPI(
     license_info={"name": "MIT License",
                    "url": "https://opensource.org/license/mit"
                    },
-    #lifespan=life_span
+    lifespan=lifespan,
     contact= {
         "email": "nuaemeka@gmail.com",
         "name": "Nnaemeka Nwankwo",
         }
 )
 
+configure_logging(Config.LOG_LEVEL)
 register_all_errors(app)
 register_middleware(app)
 
 app.include_router(book_router, prefix=f"/api/{version}/books", tags=["books"])
 app.include_router(auth_router, prefix=f"/api/{version}/auth", tags=["auth"])
 app.include_router(review_router, prefix=f"/api/{version}/reviews", tags=["reviews"])
-app.include_router(tags_router, prefix=f"/api/{version}/tags", tags=["tags"])
\ No newline at end of file
+app.include_router(tags_router, prefix=f"/api/{version}/tags", tags=["tags"])
+app.include_router(health_router, prefix=f"/api/{version}/health", tags=["health"])
+app.include_router(metrics_router)
@@ -1,15 +1,18 @@
+import logging
+import time
 from typing import List, Any
 from fastapi.security import HTTPBearer
 from fastapi.security.http import HTTPAuthorizationCredentials
-from fastapi import Request, status, Depends
+from fastapi import Request, Depends
 from sqlmodel.ext.asyncio.session import AsyncSession
-from fastapi.exceptions import HTTPException
 from abc import abstractmethod
-from .utils import decode_token
-from src.db.redis import token_in_blocklist
+from pydantic import ValidationError
+from redis.exceptions import RedisError
+from .utils import decode_token, verified_tokens
+from src.db.redis import blocklist_mirror, token_revoked
 from .service import UserService
 from src.db.main import get_session
-from src.db.models import User
+from .schemas import UserPrincipal
 from src.errors import (InvalidToken,
                         InsufficientPermission,
                         InvalidCredentials,
@@ -25,34 +28,54 @@ class TokenBearer(HTTPBearer):
         super().__init__(auto_error=auto_error)
 
 
-    async def __call__(self, request: Request) -> HTTPAuthorizationCredentials| None:
+    async def __call__(
+        self, request: Request, session: AsyncSession = Depends(get_session)
+    ) -> HTTPAuthorizationCredentials| None:
         creds = await super().__call__(request)
         token = creds.credentials
-        token_data = decode_token(token)
-        if not self.is_token_valid(token):
-            raise InvalidToken()
-            # raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail={
-            #         "error":"This token is invalid or expired",
-            #         "resolution":"Please get new token"
-            #     })
-        
+
+        cached = verified_tokens.get(token)
+        if cached:
+            token_data, checked_at = cached
+        else:
+            token_data, checked_at = decode_token(token), None
+            if not token_data:
+                raise InvalidToken()
+
         self.verify_token_data(token_data)
-        
-        if token_data["refresh"]:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                                detail={"error": "This token is invalid or expired",
-                                        "resolution": "Please get a new token"
-                                        },)
-        
-       
-        if await token_in_blocklist(token_data["jti"]):
+
+        if await self.is_revoked(token_data, checked_at, session):
             raise InvalidToken()
-        
+
+        if not cached:
+            verified_tokens.put(token, token_data, time.monotonic())
+
         return token_data
 
-    def is_token_valid(self, token) -> bool:
-        token_data = decode_token(token)
-        return True if token_data else False
+    async def is_revoked(self, token_data: dict, checked_at: float | None, session: AsyncSession) -> bool:
+        jti = token_data["jti"]
+        user_uid = token_data["user"]["user_uid"]
+        # tokens issued before versioning carry none and count as version 0
+        version = token_data["user"].get("token_version", 0)
+
+        blocklist_mirror.start()
+
+        if jti in blocklist_mirror or blocklist_mirror.outdated(user_uid, version):
+            return True
+
+        # checked against redis before, and every revocation since then
+        # has been delivered to the mirror
+        if checked_at is not None and blocklist_mirror.covers(checked_at):
+            return False
+
+        try:
+            return await token_revoked(
+                jti, user_uid, version, lambda: user_service.get_token_version(user_uid, session)
+            )
+        except RedisError as e:
+            # serve from the mirror rather than reject every request
+            logging.warning("blocklist unavailable, using local mirror: %s", e)
+            return False
     
     #@abstractmethod
     def verify_token_data(self, token_data):
@@ -76,24 +99,44 @@ class RefreshTokenBearer(TokenBearer):
 #   "password": "fortytwo"
 # }
 
-async def get_current_user(
-    token_details: dict = Depends(AccessTokenBearer()),
-    session: AsyncSession = Depends(get_session),
-):
-    user_email = token_details["user"]["email"]
+access_token_bearer = AccessTokenBearer()
 
-    user = await user_service.get_user_by_email(user_email, session)
 
-    return user
+async def get_current_user(
+    token_details: dict = Depends(access_token_bearer),
+) -> UserPrincipal:
+    # access tokens carry everything authorization needs, so no lookup;
+    # revoking the user's tokens is what makes changed claims take effect,
+    # except verification, which RoleChecker looks up while unverified
+    claims = token_details["user"]
+
+    try:
+        return UserPrincipal(
+            uid=claims["user_uid"],
+            email=claims["email"],
+            role=claims["role"],
+            is_verified=claims["is_verified"],
+        )
+    except (KeyError, ValidationError):
+        # issued before the claims were added; a refresh gets a new one
+        raise InvalidToken()
 
 
 class RoleChecker:
     def __init__(self, allowed_roles: List[str]) -> None:
         self.allowed_roles = allowed_roles
 
-    def __call__(self, current_user: User = Depends(get_current_user)) -> Any:
+    async def __call__(
+        self,
+        current_user: UserPrincipal = Depends(get_current_user),
+        session: AsyncSession = Depends(get_session),
+    ) -> Any:
+        # verifying an account revokes nothing, so a token that says
+        # unverified may be out of date; only then is the user looked up
         if not current_user.is_verified:
-            raise AccountNotVerified()
+            principal = await user_service.get_principal(current_user.email, session)
+            if principal is None or not principal.is_verified:
+                raise AccountNotVerified()
         if current_user.role in self.allowed_roles:
             return True
 
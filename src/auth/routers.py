@@ -11,14 +11,15 @@ from .dependencies import RefreshTokenBearer, AccessTokenBearer,  get_current_us
 from .schemas import UserCreateModel, UserModel, UserLoginModel, UserBooksModel, EmailModel, PasswordResetRequestModel, PasswordResetConfirmModel
 from .service import UserService
 from src.db.main import get_session
-from .utils import create_access_token, verify_passwd, create_url_safe_token, decode_url_safe_token, generate_passwd_hash
+from src.db.loading import USER_PROFILE
+from .utils import create_access_token, user_claims, verify_passwd_async, create_url_safe_token, decode_url_safe_token, generate_passwd_hash_async
 from src.db.redis import add_jti_to_blocklist
 from .dependencies import RoleChecker
 from src.mail import create_message
-from src.celery_tasks import send_email
-from src.mail import mail
+from src.celery_tasks import queue_email
 from src.config import Config
 from src.errors import UserNotFound
+from src.ratelimit import rate_limit
 
 
 user_service = UserService()
@@ -26,7 +27,7 @@ auth_router = APIRouter()
 role_checker = RoleChecker(["admin", "user"])
 REFRESH_TOKEN_EXPIRY = 2
 
-@auth_router.post("/send_mail")
+@auth_router.post("/send_mail", dependencies=[Depends(rate_limit)])
 async def send_mail(emails: EmailModel):
     emails = emails.addresses
 
@@ -37,14 +38,15 @@ async def send_mail(emails: EmailModel):
     #     subject="Welcome",
     #     body=html,
     # )
-    # await mail.send_message(messages)
-    send_email.delay(emails, subject, html)
+    # await get_mail().send_message(messages)
+    queue_email(emails, subject, html)
 
     return {"message": "Email sent successfully"}
 
 
 @auth_router.post("/signup",
-                  status_code = status.HTTP_201_CREATED)
+                  status_code = status.HTTP_201_CREATED,
+                  dependencies=[Depends(rate_limit)])
 async def create_user_account(user_request: UserCreateModel,
                               bg_tasks: BackgroundTasks, 
                               session: AsyncSession= Depends(get_session)):
@@ -66,9 +68,9 @@ async def create_user_account(user_request: UserCreateModel,
     #     body=html,
     # )
     subject = "Verify your email"
-    # bg_tasks.add_task(mail.send_message, messages)
-    #await mail.send_message(messages)
-    send_email.delay([email], subject, html)
+    # bg_tasks.add_task(get_mail().send_message, messages)
+    #await get_mail().send_message(messages)
+    queue_email([email], subject, html)
     return {
         "messages": "Account created! Check email to verify",
         "user": new_user
@@ -101,30 +103,22 @@ async def verify_user_account(token: str, session: AsyncSession = Depends(get_se
     )
 
 
-@auth_router.post("/login")
+@auth_router.post("/login", dependencies=[Depends(rate_limit)])
 async def login_users(user_login: UserLoginModel, session: AsyncSession= Depends(get_session)):
     email = user_login.email
     passwd = user_login.password
 
     user = await user_service.get_user_by_email(email, session)
     if user:
-        is_valid_passwd = verify_passwd(passwd, user.password_hash)
+        is_valid_passwd = await verify_passwd_async(passwd, user.password_hash)
 
         if is_valid_passwd:
             access_token = create_access_token(
-                user_data={
-                    "email": user.email,
-                    "user_uid": str(user.uid),
-                    "role": user.role
-
-                }
+                user_data=user_claims(user, user.token_version)
             )
 
             refresh_token = create_access_token(
-                user_data={
-                    "email": user.email,
-                    "user_uid": str(user.uid)
-                },
+                user_data=user_claims(user, user.token_version, refresh=True),
                 refresh=True,
                 expiry = timedelta(days=REFRESH_TOKEN_EXPIRY))
 
@@ -145,11 +139,19 @@ async def login_users(user_login: UserLoginModel, session: AsyncSession= Depends
 
 
 @auth_router.get("/refresh_token")
-async def get_new_access_token(token_details: dict = Depends(RefreshTokenBearer())):
+async def get_new_access_token(token_details: dict = Depends(RefreshTokenBearer()),
+                               session: AsyncSession = Depends(get_session)):
     expiry_timestamp = token_details["exp"]
 
     if datetime.fromtimestamp(expiry_timestamp) > datetime.now():
-         new_access_token = create_access_token(user_data=token_details["user"])
+         # the claims are read afresh, so a refresh picks up role or verification changes
+         user = await user_service.get_principal(token_details["user"]["email"], session)
+         if user is None:
+             raise UserNotFound()
+
+         new_access_token = create_access_token(
+             user_data=user_claims(user, token_details["user"].get("token_version", 0))
+         )
 
          return JSONResponse(
              content={"access_token": new_access_token}
@@ -161,13 +163,21 @@ async def get_new_access_token(token_details: dict = Depends(RefreshTokenBearer(
 
 @auth_router.get("/me", response_model=UserBooksModel)
 async def get_current_user(
-    user=Depends(get_current_user), _: bool = Depends(role_checker)
+    user=Depends(get_current_user),
+    _: bool = Depends(role_checker),
+    session: AsyncSession = Depends(get_session),
 ):
-    return user
+    return await user_service.get_user_by_email(user.email, session, load=USER_PROFILE)
 
 @auth_router.get("/logout")
-async def revoke_token(token_details: dict = Depends(AccessTokenBearer())):
-    await add_jti_to_blocklist(token_details["jti"])
+async def revoke_token(token_details: dict = Depends(AccessTokenBearer()),
+                       everywhere: bool = False,
+                       session: AsyncSession = Depends(get_session)):
+    # one session by its jti, or every token the user holds by bumping their version
+    if everywhere:
+        await user_service.revoke_tokens(token_details["user"]["user_uid"], session)
+    else:
+        await add_jti_to_blocklist(token_details["jti"])
 
     return JSONResponse(
         content={"message": "Logged Out Successfully"}, status_code=status.HTTP_200_OK
@@ -175,7 +185,7 @@ async def revoke_token(token_details: dict = Depends(AccessTokenBearer())):
 
 
 
-@auth_router.post("/password-reset-request")
+@auth_router.post("/password-reset-request", dependencies=[Depends(rate_limit)])
 async def password_reset_request(email_data: PasswordResetRequestModel):
     email = email_data.email
 
@@ -189,7 +199,7 @@ async def password_reset_request(email_data: PasswordResetRequestModel):
     """
     subject = "Reset Your Password"
 
-    send_email.delay([email], subject, html_message)
+    queue_email([email], subject, html_message)
     return JSONResponse(
         content={
             "message": "Please check your email for instructions to reset your password",
@@ -222,7 +232,7 @@ async def reset_account_password(
         if not user:
             raise UserNotFound()
 
-        passwd_hash = generate_passwd_hash(new_password)
+        passwd_hash = await generate_passwd_hash_async(new_password)
         await user_service.update_user(user, {"password_hash": passwd_hash}, session)
 
         return JSONResponse(
@@ -32,6 +32,15 @@ class UserModel(BaseModel):
         return f"<User {self.username}>"
 
 
+class UserPrincipal(BaseModel):
+    """The slice of a user that authorization needs on every request"""
+
+    uid: uuid.UUID
+    email: str
+    role: str
+    is_verified: bool
+
+
 class UserBooksModel(UserModel):
     books: List[Books]
     reviews: List[ReviewModel]
@@ -1,15 +1,32 @@
+import logging
+from typing import Optional, Sequence
+import uuid
 
+from redis.exceptions import RedisError
+from sqlalchemy import update
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 
+from src.db.loading import load_options
 from src.db.models import User
-from .schemas import UserCreateModel
-from .utils import generate_passwd_hash
+from src.db.redis import cache_principal, get_cached_principal, invalidate_principal, publish_token_version
+from .schemas import UserCreateModel, UserPrincipal
+from .utils import generate_passwd_hash_async
+
+# changing one of these revokes the user's tokens
+REVOKING_FIELDS = {"role", "password_hash"}
+
 
 class UserService:
 
-    async def get_user_by_email(self, email: str, session: AsyncSession):
-        statement = select(User).where(User.email == email)
+    async def get_user_by_email(
+        self, email: str, session: AsyncSession, load: Sequence[str] = ()
+    ):
+        statement = (
+            select(User)
+            .where(User.email == email)
+            .options(*load_options(User, load))
+        )
 
         result = await session.exec(statement)
 
@@ -18,6 +35,65 @@ class UserService:
         return user
     
 
+    async def get_principal(
+        self, email: str, session: AsyncSession
+    ) -> Optional[UserPrincipal]:
+        cached = await get_cached_principal(email)
+
+        if cached:
+            return UserPrincipal.model_validate_json(cached)
+
+        statement = select(User.uid, User.email, User.role, User.is_verified).where(
+            User.email == email
+        )
+
+        result = await session.exec(statement)
+
+        row = result.first()
+
+        if row is None:
+            return None
+
+        principal = UserPrincipal.model_validate(row._mapping)
+        await cache_principal(email, principal.model_dump_json())
+
+        return principal
+
+    async def get_token_version(self, user_uid: str, session: AsyncSession) -> int:
+        """The version the user's valid tokens carry; 0 for an unknown user"""
+        statement = select(User.token_version).where(User.uid == uuid.UUID(user_uid))
+
+        result = await session.exec(statement)
+
+        return result.first() or 0
+
+    async def revoke_tokens(self, user_uid: str, session: AsyncSession) -> int:
+        """Revoke every token issued to the user so far"""
+        version = await self._bump_token_version(user_uid, session)
+        await session.commit()
+        await self._publish_token_version(user_uid, version)
+
+        return version
+
+    async def _bump_token_version(self, user_uid: str, session: AsyncSession) -> int:
+        # in the caller's transaction, and atomic, so concurrent bumps both count
+        statement = (
+            update(User)
+            .where(User.uid == uuid.UUID(user_uid))
+            .values(token_version=User.token_version + 1)
+            .returning(User.token_version)
+        )
+
+        return await session.scalar(statement)
+
+    async def _publish_token_version(self, user_uid: str, version: int) -> None:
+        try:
+            await publish_token_version(user_uid, version)
+        except RedisError as e:
+            # the new version is committed and must not fail the request;
+            # tokens issued before it stay valid until the cached one expires
+            logging.error("could not revoke tokens of user %s: %s", user_uid, e)
+
     async def user_exist(self, email: str, session: AsyncSession) -> bool:
 
         user = await self.get_user_by_email(email, session)
@@ -32,7 +108,7 @@ class UserService:
             **user_dict
         )
 
-        new_user.password_hash = generate_passwd_hash(user_dict["password"])
+        new_user.password_hash = await generate_passwd_hash_async(user_dict["password"])
         new_user.role = "user"
         session.add(new_user)
         await session.commit()
@@ -44,6 +120,15 @@ class UserService:
         for k, v in user_data.items():
             setattr(user, k, v)
 
+        # outstanding tokens carry the old role, or were issued against the
+        # old password, so they are revoked in the same commit
+        revoking = user_data.keys() & REVOKING_FIELDS
+        if revoking:
+            version = await self._bump_token_version(str(user.uid), session)
+
         await session.commit()
+        await invalidate_principal(user.email)
+        if revoking:
+            await self._publish_token_version(str(user.uid), version)
 
         return user
\ No newline at end of file
@@ -1,12 +1,19 @@
 
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta, datetime
+import hashlib
 import logging
+import time
+from typing import Optional, Tuple
 import uuid
 import jwt
 from passlib.context import CryptContext
 from itsdangerous import URLSafeTimedSerializer
 
 from src.config import Config
+from src.errors import ServerBusy
 
 passwd_ctx = CryptContext(
     schemes=["bcrypt"]
@@ -25,6 +32,80 @@ def verify_passwd(passwd: str, hash: str) -> True:
     return passwd_ctx.verify(passwd, hash)
 
 
+# bcrypt holds the GIL for its whole ~250ms, so a thread pool would still
+# stall the event loop; the work goes to separate processes instead
+_hash_executor: Optional[ProcessPoolExecutor] = None
+_hash_pending = 0
+
+
+def get_hash_executor() -> ProcessPoolExecutor:
+    global _hash_executor
+
+    if _hash_executor is None:
+        _hash_executor = ProcessPoolExecutor(max_workers=Config.HASH_WORKERS)
+
+    return _hash_executor
+
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+
+def _worker_ready() -> bool:
+    return True
+
+
+async def warm_hash_executor() -> None:
+    """Start every hash worker now rather than on the first logins"""
+    loop = asyncio.get_running_loop()
+    executor = get_hash_executor()
+    # a worker is started per submitted task while none is idle
+    await asyncio.gather(
+        *[loop.run_in_executor(executor, _worker_ready) for _ in range(Config.HASH_WORKERS)]
+    )
+
+
+async def _run_in_hash_executor(func, *args):
+    global _hash_pending
+
+    # shed load instead of letting a login burst queue up behind the pool
+    if _hash_pending >= Config.HASH_QUEUE_LIMIT:
+        raise ServerBusy()
+
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_executor(), func, *args)
+    finally:
+        _hash_pending -= 1
+
+
+async def generate_passwd_hash_async(passwd: str) -> str:
+    return await _run_in_hash_executor(generate_passwd_hash, passwd)
+
+
+async def verify_passwd_async(passwd: str, hash: str) -> bool:
+    return await _run_in_hash_executor(verify_passwd, passwd, hash)
+
+
+def user_claims(user, token_version: int, refresh: bool = False) -> dict:
+    """What a token says about its user.
+
+    Access tokens carry the role and verification status, so authorizing
+    a request needs no lookup; both kinds carry the user's token version,
+    and bumping it revokes them all.
+    """
+    claims = {"email": user.email, "user_uid": str(user.uid), "token_version": token_version}
+    if not refresh:
+        claims.update(role=user.role, is_verified=user.is_verified)
+
+    return claims
+
+
 def create_access_token(user_data: dict, expiry: timedelta = None,
                         refresh: bool = False):
     payload = {
@@ -56,6 +137,47 @@ def decode_token(token: str) -> dict:
         logging.exception(e)
         return None
 
+class VerifiedTokenCache:
+    """Bounded LRU of decoded tokens, keyed by a hash of the raw token.
+
+    Entries are dropped once the token's own `exp` passes, so a hit is
+    exactly as valid as a fresh `decode_token`. Each entry also records
+    when it was checked against the blocklist.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Tuple[dict, float]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+        if entry[0]["exp"] <= time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, token: str, token_data: dict, checked_at: float) -> None:
+        key = self._key(token)
+        self._entries[key] = (token_data, checked_at)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+verified_tokens = VerifiedTokenCache(max_size=Config.TOKEN_CACHE_SIZE)
+
+
 serializer = URLSafeTimedSerializer(
     secret_key=Config.JWT_SECRET, salt="email-configuration"
 )
@@ -0,0 +1,153 @@
+import csv
+import json
+import tempfile
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import column, select, table, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.errors import ImportTooLarge
+
+from .schemas import BookCreateModel
+from .search import matching_books, update_search_vectors
+
+# staging rows go straight into a temp table through COPY; ON COMMIT DELETE
+# ROWS empties it at every chunk commit, so pooled connections reuse it
+STAGING_TABLE = "books_import"
+STAGING_COLUMNS = [
+    "uid", "title", "author", "publisher", "published_date", "page_count",
+    "language", "user_uid", "created_at", "updated_at",
+]
+CREATE_STAGING = text(
+    f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+    f"(LIKE books INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+)
+MERGE_STAGING = text(
+    f"INSERT INTO books ({', '.join(STAGING_COLUMNS)}) "
+    f"SELECT {', '.join(STAGING_COLUMNS)} FROM {STAGING_TABLE} "
+    f"ON CONFLICT (uid) DO NOTHING"
+)
+
+
+SPOOL_READ_SIZE = 64 * 1024
+
+
+async def spool_body(
+    chunks: AsyncIterator[bytes], max_size: int, limit: int
+) -> tempfile.SpooledTemporaryFile:
+    """Copy a request body into memory, overflowing to disk past `max_size`.
+
+    The body has to be read before a streamed response starts: under ASGI
+    < 2.4 the response listens on the same receive channel for disconnects
+    and would swallow the remaining body messages. A body over `limit`
+    bytes raises ImportTooLarge as soon as it gets there, before it can
+    fill the disk.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_size)
+    size = 0
+
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > limit:
+            spool.close()
+            raise ImportTooLarge()
+        spool.write(chunk)
+
+    spool.seek(0)
+    return spool
+
+
+async def iter_spool(spool: tempfile.SpooledTemporaryFile) -> AsyncIterator[bytes]:
+    while chunk := spool.read(SPOOL_READ_SIZE):
+        yield chunk
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed request body into lines without buffering all of it"""
+    pending = b""
+
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+
+    if pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+
+async def iter_rows(lines: AsyncIterator[str], format: str) -> AsyncIterator[Tuple[int, dict | None, str | None]]:
+    """Yield (line number, row dict, parse error) for every non-blank line.
+
+    CSV input needs a header row; quoted fields may not span lines.
+    """
+    header = None
+    line_no = 0
+
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+
+        if format == "ndjson":
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_no, None, "expected a JSON object"
+                continue
+            yield line_no, row, None
+
+        else:
+            values = next(csv.reader([line]))
+            if header is None:
+                header = values
+                continue
+            if len(values) != len(header):
+                yield line_no, None, f"expected {len(header)} fields, got {len(values)}"
+                continue
+            yield line_no, dict(zip(header, values)), None
+
+
+def validate_row(row: dict, user_uid: uuid.UUID) -> Tuple[tuple | None, list | None]:
+    """Build a staging record from a row, or return its validation errors"""
+    try:
+        book = BookCreateModel(**row)
+        published_date = datetime.strptime(book.published_date, "%Y-%m-%d").date()
+    except ValidationError as e:
+        return None, json.loads(e.json(include_url=False))
+    except ValueError as e:
+        return None, [{"loc": ["published_date"], "msg": str(e)}]
+
+    now = datetime.now()
+
+    return (
+        uuid.uuid4(), book.title, book.author, book.publisher, published_date,
+        book.page_count, book.language, user_uid, now, now,
+    ), None
+
+
+async def copy_into_books(session: AsyncSession, records: List[tuple]) -> None:
+    """COPY `records` into the staging table and merge them into books.
+
+    Runs in the session's current transaction; the caller commits.
+    """
+    await session.exec(CREATE_STAGING)
+
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        STAGING_TABLE, records=records, columns=STAGING_COLUMNS
+    )
+
+    await session.exec(MERGE_STAGING)
+    await session.exec(
+        update_search_vectors(
+            matching_books(select(column("uid")).select_from(table(STAGING_TABLE)))
+        )
+    )
@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, Optional
+import uuid
+
+from sqlalchemy import Select, func, select, tuple_
+
+from src.db.models import Books, BookTag, Tag
+from src.pagination import decode_cursor, encode_cursor
+
+EXPORT_KEYS = (Books.created_at, Books.uid)
+EXPORT_TAG = "export"
+BOOK_COLUMNS = [
+    "uid", "title", "author", "publisher", "published_date", "page_count",
+    "language", "user_uid", "created_at", "updated_at", "review_count",
+    "average_rating",
+]
+EXPORT_FIELDS = BOOK_COLUMNS + ["tags", "cursor"]
+
+
+def export_statement(after: Optional[tuple] = None) -> Select:
+    """Every book in (created_at, uid) order with its tags and rating stats.
+
+    Books are walked oldest first so rows added during an export land after
+    the cursor instead of shifting the ones already sent.
+    """
+    tags = (
+        select(func.array_agg(Tag.name))
+        .join(BookTag, BookTag.tag_id == Tag.uid)
+        .where(BookTag.book_id == Books.uid)
+        .scalar_subquery()
+    )
+
+    statement = (
+        select(
+            *[getattr(Books, column) for column in BOOK_COLUMNS],
+            tags.label("tags"),
+        )
+        .order_by(*EXPORT_KEYS)
+    )
+
+    if after is not None:
+        statement = statement.where(tuple_(*EXPORT_KEYS) > tuple_(*after))
+
+    return statement
+
+
+def decode_export_cursor(cursor: str) -> tuple:
+    values, _ = decode_cursor(cursor, EXPORT_KEYS, EXPORT_TAG)
+    return tuple(values)
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (Decimal, float)):
+        return round(float(value), 2)
+    return value
+
+
+def export_record(row: Any) -> dict:
+    """Turn one result row into the dict written for it, cursor included.
+
+    Each line carries the cursor that resumes the export right after it.
+    """
+    record = {key: _plain(value) for key, value in row._mapping.items()}
+    record["tags"] = sorted(record["tags"] or [])
+    record["cursor"] = encode_cursor((row.created_at, row.uid), "next", EXPORT_TAG)
+
+    return record
+
+
+def to_ndjson(records: Iterable[dict]) -> str:
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def to_csv(records: Iterable[dict], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+
+    if header:
+        writer.writeheader()
+    for record in records:
+        writer.writerow({**record, "tags": "|".join(record["tags"])})
+
+    return buffer.getvalue()
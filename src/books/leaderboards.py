@@ -0,0 +1,222 @@
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+import uuid
+
+from redis.exceptions import RedisError
+from sqlalchemy import text
+
+from src.config import Config
+from src.db.redis import redis_client
+
+TRENDING = "trending"
+TOP_RATED = "top_rated"
+BOARDS = (TRENDING, TOP_RATED)
+CARDS_KEY = "leaderboard:cards"
+META_KEY = "leaderboard:meta"
+CARD_COLUMNS = ("uid", "title", "author", "publisher", "language")
+
+# A review made at time t adds 2^((t - epoch) / half_life) to its book, so
+# newer reviews outweigh older ones by a factor of two per half-life and
+# the set's order is the decayed order without ever rescoring old members.
+# The epoch lives next to the set and is moved forward by every rebuild,
+# which keeps the weights small; reading it in the script makes the
+# increment atomic with respect to a rebuild swapping the set.
+TRENDING_INCREMENT = """
+local epoch = redis.call('HGET', KEYS[2], 'trending_epoch')
+if not epoch then
+    epoch = ARGV[2]
+    redis.call('HSET', KEYS[2], 'trending_epoch', epoch)
+end
+local weight = ARGV[4] * math.pow(2, (ARGV[2] - epoch) / ARGV[3])
+local score = tonumber(redis.call('ZINCRBY', KEYS[1], weight, ARGV[1]))
+if score <= 1e-9 then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(tonumber(ARGV[5]) + 1))
+return tostring(score)
+"""
+
+TRENDING_SCORES = text("""
+    SELECT book_uid AS uid,
+           sum(power(2, extract(epoch FROM created_at - CAST(:epoch AS timestamp))
+                        / CAST(:half_life AS float8))) AS score
+    FROM reviews
+    WHERE created_at >= CAST(:epoch AS timestamp) AND book_uid IS NOT NULL
+    GROUP BY book_uid
+    ORDER BY score DESC
+    LIMIT :size
+""")
+
+TOP_RATED_SCORES = text("""
+    SELECT uid,
+           (rating_sum + CAST(:prior_reviews AS float8) * CAST(:prior_mean AS float8))
+               / (review_count + CAST(:prior_reviews AS float8)) AS score
+    FROM books
+    WHERE review_count > 0
+    ORDER BY score DESC, uid
+    LIMIT :size
+""")
+
+CARDS = text(f"SELECT {', '.join(CARD_COLUMNS)} FROM books WHERE uid = ANY(:uids)")
+
+
+def _key(board: str) -> str:
+    return f"leaderboard:{board}"
+
+
+def _half_life() -> float:
+    return Config.TRENDING_HALF_LIFE_HOURS * 3600
+
+
+def top_rated_score(review_count: int, rating_sum: int) -> float:
+    """Average rating pulled towards a prior, so one 4-star review is not the top book"""
+    prior = Config.TOP_RATED_PRIOR_REVIEWS
+
+    return (rating_sum + prior * Config.TOP_RATED_PRIOR_MEAN) / (review_count + prior)
+
+
+def book_card(book) -> bytes:
+    card = {column: getattr(book, column) for column in CARD_COLUMNS}
+    card["uid"] = str(card["uid"])
+
+    return json.dumps(card).encode()
+
+
+class Leaderboards:
+    """Trending and top-rated books, ranked in Redis sorted sets.
+
+    Review writes update the sets as they happen; `rebuild` recomputes both
+    from Postgres to correct for anything missed while Redis was away.
+    Reads return None when Redis cannot answer, so callers can fall back
+    to `query`.
+    """
+
+    def __init__(self) -> None:
+        self._increment = redis_client.register_script(TRENDING_INCREMENT)
+
+    async def record_review(self, book, created_at: datetime, review_count: int, rating_sum: int) -> None:
+        await self._record(book.uid, created_at, 1, review_count, rating_sum, card=book_card(book))
+
+    async def record_review_removed(
+        self, book_uid: uuid.UUID, created_at: datetime, review_count: int, rating_sum: int
+    ) -> None:
+        await self._record(book_uid, created_at, -1, review_count, rating_sum)
+
+    async def _record(
+        self,
+        book_uid: uuid.UUID,
+        created_at: datetime,
+        sign: int,
+        review_count: int,
+        rating_sum: int,
+        card: Optional[bytes] = None,
+    ) -> None:
+        member = str(book_uid)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                if created_at.timestamp() >= time.time() - Config.TRENDING_WINDOW_DAYS * 86400:
+                    await self._increment(
+                        keys=[_key(TRENDING), META_KEY],
+                        args=[member, created_at.timestamp(), _half_life(), sign, Config.LEADERBOARD_SIZE],
+                        client=pipe,
+                    )
+                if review_count:
+                    pipe.zadd(_key(TOP_RATED), {member: top_rated_score(review_count, rating_sum)})
+                    pipe.zremrangebyrank(_key(TOP_RATED), 0, -(Config.LEADERBOARD_SIZE + 1))
+                else:
+                    pipe.zrem(_key(TOP_RATED), member)
+                if card is not None:
+                    pipe.hset(CARDS_KEY, member, card)
+                await pipe.execute()
+        except RedisError as e:
+            # the next rebuild puts the book back where it belongs
+            logging.warning("leaderboard update failed for %s: %s", member, e)
+
+    async def top(self, board: str, limit: int) -> Optional[bytes]:
+        """The top `limit` entries as a serialized JSON list, or None if Redis is unavailable"""
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.zrevrange(_key(board), 0, limit - 1, withscores=True)
+                pipe.hget(META_KEY, "trending_epoch")
+                entries, epoch = await pipe.execute()
+            if not entries:
+                return None
+            cards = await redis_client.hmget(CARDS_KEY, [member for member, _ in entries])
+        except RedisError as e:
+            logging.warning("leaderboard read failed: %s", e)
+            return None
+
+        if board == TRENDING and epoch is not None:
+            # express scores as "reviews made right now", whatever the epoch
+            scale = 2 ** ((time.time() - float(epoch)) / _half_life())
+        else:
+            scale = 1.0
+
+        return b"[" + b",".join(
+            b'{"book":' + card + b',"score":' + json.dumps(round(score / scale, 4)).encode() + b"}"
+            for (_, score), card in zip(entries, cards)
+            if card is not None
+        ) + b"]"
+
+    async def query(self, conn, board: str, limit: int, epoch: Optional[datetime] = None) -> List[dict]:
+        """Compute a leaderboard in Postgres: the rebuild, and the fallback when Redis is down"""
+        if board == TRENDING:
+            epoch = epoch or datetime.now() - timedelta(days=Config.TRENDING_WINDOW_DAYS)
+            params = {"epoch": epoch, "half_life": _half_life(), "size": limit}
+            rows = (await conn.execute(TRENDING_SCORES, params)).all()
+        else:
+            params = {
+                "prior_reviews": Config.TOP_RATED_PRIOR_REVIEWS,
+                "prior_mean": Config.TOP_RATED_PRIOR_MEAN,
+                "size": limit,
+            }
+            rows = (await conn.execute(TOP_RATED_SCORES, params)).all()
+
+        books = await self._cards(conn, [row.uid for row in rows])
+        scale = 2 ** ((datetime.now() - epoch).total_seconds() / _half_life()) if board == TRENDING else 1.0
+
+        return [
+            {"book": books[row.uid], "score": round(float(row.score) / scale, 4)}
+            for row in rows
+            if row.uid in books
+        ]
+
+    async def _cards(self, conn, uids: Sequence[uuid.UUID]) -> dict:
+        if not uids:
+            return {}
+        rows = (await conn.execute(CARDS, {"uids": list(uids)})).all()
+        return {row.uid: {**row._mapping, "uid": str(row.uid)} for row in rows}
+
+    async def rebuild(self, conn) -> dict:
+        """Recompute both boards from Postgres and swap them in atomically"""
+        epoch = datetime.now() - timedelta(days=Config.TRENDING_WINDOW_DAYS)
+        size = Config.LEADERBOARD_SIZE
+        trending = (
+            await conn.execute(TRENDING_SCORES, {"epoch": epoch, "half_life": _half_life(), "size": size})
+        ).all()
+        top_rated = (
+            await conn.execute(
+                TOP_RATED_SCORES,
+                {"prior_reviews": Config.TOP_RATED_PRIOR_REVIEWS, "prior_mean": Config.TOP_RATED_PRIOR_MEAN, "size": size},
+            )
+        ).all()
+        cards = await self._cards(conn, {row.uid for row in trending} | {row.uid for row in top_rated})
+
+        async with redis_client.pipeline(transaction=True) as pipe:
+            for board, rows in ((TRENDING, trending), (TOP_RATED, top_rated)):
+                pipe.delete(_key(board))
+                if rows:
+                    pipe.zadd(_key(board), {str(row.uid): float(row.score) for row in rows})
+            pipe.delete(CARDS_KEY)
+            if cards:
+                pipe.hset(CARDS_KEY, mapping={str(uid): json.dumps(card) for uid, card in cards.items()})
+            pipe.hset(META_KEY, "trending_epoch", epoch.timestamp())
+            await pipe.execute()
+
+        return {TRENDING: len(trending), TOP_RATED: len(top_rated)}
+
+
+leaderboards = Leaderboards()
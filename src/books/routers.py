@@ -1,38 +1,79 @@
-from fastapi import APIRouter, Depends, status
-from typing import List
+import json
+from typing import List, Literal, Optional
+import uuid
+
+from fastapi import APIRouter, Depends, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
 from fastapi.exceptions import HTTPException
 from sqlmodel.ext.asyncio.session import AsyncSession 
 
 
-from .schemas import BookUpdateModel, Books, BookCreateModel, BookDetailModel
-from src.db.main import get_session
+from .schemas import BookUpdateModel, Books, BookCreateModel, BookDetailModel, LeaderboardEntry
+from src.db import models
+from src.db.main import async_session_maker, get_read_session, get_session, read_session_maker, reads_primary
+from src.books.bulk import iter_spool, spool_body
+from src.books.export import decode_export_cursor, to_csv, to_ndjson
+from src.books.leaderboards import TOP_RATED, TRENDING, leaderboards
 from src.books.service import BookService
 from src.auth.dependencies import RoleChecker
-from src.auth.dependencies import AccessTokenBearer
+from src.auth.dependencies import access_token_bearer
+from src.cache import MISSING, book_detail_cache
+from src.compression import packed_response
+from src.db.loading import BOOK_DETAIL
 from src.errors import BookNotFound
+from src.config import Config
+from src.fastjson import model_columns, page_response
+from src.pagination import Page, PageParams
+from src.watermarks import BOOKS, book_key, conditional
 
 book_service = BookService()
 book_router = APIRouter()
-access_token_bearer = AccessTokenBearer()
 role_checker = Depends(RoleChecker(["admin", "user"]))
+admin_role_checker = Depends(RoleChecker(["admin"]))
+BOOK_LIST_COLUMNS = model_columns(Books, models.Books)
+
+
+def list_columns() -> list:
+    # with fast responses on, list routes select bare columns and skip the ORM
+    return BOOK_LIST_COLUMNS if Config.FAST_JSON_RESPONSES else []
+
 
-@book_router.get("/", response_model=List[Books], dependencies=[role_checker] )
-async def get_all_books(session: AsyncSession= Depends(get_session),
-                        token_details: dict =Depends(access_token_bearer)
+def book_page_response(page: Page, headers: Optional[dict] = None):
+    return page_response(page, Books, headers) if Config.FAST_JSON_RESPONSES else page
+
+
+@book_router.get("/", response_model=Page[Books], dependencies=[role_checker] )
+async def get_all_books(page: PageParams = Depends(),
+                        sort: Literal["newest", "most_reviewed", "top_rated"] = Query(default="newest"),
+                        session: AsyncSession= Depends(get_read_session),
+                        token_details: dict =Depends(access_token_bearer),
+                        validators: dict = Depends(conditional(BOOKS))
                         ):
-    return await book_service.get_all_books(session)
+    books = await book_service.get_all_books(session, page, sort, columns=list_columns())
+    # a replica may be behind the validator, which was read first
+    return book_page_response(books, validators if reads_primary(session) else None)
 
 @book_router.get(
-    "/user/{user_uid}", response_model=List[Books], dependencies=[role_checker]
+    "/user/{user_uid}", response_model=Page[Books], dependencies=[role_checker]
 )
 async def get_user_book_submissions(
-    user_uid: str,
-    session: AsyncSession = Depends(get_session),
+    user_uid: uuid.UUID,
+    page: PageParams = Depends(),
+    session: AsyncSession = Depends(get_read_session),
     _: dict = Depends(access_token_bearer),
 ):
-    books = await book_service.get_user_books(user_uid, session)
-    return books
+    books = await book_service.get_user_books(user_uid, session, page, columns=list_columns())
+    return book_page_response(books)
+
 
+@book_router.get("/search", response_model=Page[Books], dependencies=[role_checker])
+async def search_books(q: str = Query(min_length=1, max_length=200, description="Words, \"quoted phrases\", or -excluded words"),
+                       language: Optional[str] = Query(default=None),
+                       page: PageParams = Depends(),
+                       session: AsyncSession = Depends(get_read_session),
+                       _: dict = Depends(access_token_bearer)):
+    books = await book_service.search_books(q, session, page, language, columns=list_columns())
+    return book_page_response(books)
 
 
 @book_router.post("/", status_code=status.HTTP_201_CREATED, dependencies=[role_checker])
@@ -48,20 +89,111 @@ async def create_a_book(book: BookCreateModel,
     # return data
 
 
+@book_router.post("/import", dependencies=[role_checker])
+async def import_books(request: Request,
+                       format: Literal["ndjson", "csv"] = Query(default="ndjson"),
+                       token_details: dict =Depends(access_token_bearer)):
+    user_uid = token_details.get("user")["user_uid"]
+
+    spool = await spool_body(
+        request.stream(), Config.BOOK_IMPORT_SPOOL_SIZE, Config.BOOK_IMPORT_MAX_SIZE
+    )
+
+    # the import outlives the route function, so it opens its own session
+    # instead of borrowing one that is closed before the response is streamed
+    async def results():
+        try:
+            async with async_session_maker() as session:
+                async for result in book_service.import_books(
+                    iter_spool(spool), format, user_uid, session
+                ):
+                    yield json.dumps(result) + "\n"
+        finally:
+            spool.close()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+async def leaderboard_response(board: str, limit: int) -> Response:
+    payload = await leaderboards.top(board, limit)
+
+    if payload is None:
+        # Redis is down or the board has not been built yet
+        async with read_session_maker()() as session:
+            entries = await leaderboards.query(await session.connection(), board, limit)
+        payload = json.dumps(entries).encode()
+
+    return Response(content=payload, media_type="application/json")
+
+
+@book_router.get("/trending", response_model=List[LeaderboardEntry], dependencies=[role_checker])
+async def trending_books(limit: int = Query(default=10, ge=1, le=100),
+                         _: dict = Depends(access_token_bearer)):
+    return await leaderboard_response(TRENDING, limit)
+
+
+@book_router.get("/top-rated", response_model=List[LeaderboardEntry], dependencies=[role_checker])
+async def top_rated_books(limit: int = Query(default=10, ge=1, le=100),
+                          _: dict = Depends(access_token_bearer)):
+    return await leaderboard_response(TOP_RATED, limit)
+
+
+@book_router.get("/export", dependencies=[admin_role_checker])
+async def export_books(format: Literal["ndjson", "csv"] = Query(default="ndjson"),
+                       cursor: Optional[str] = Query(default=None, description="`cursor` of the last row received, to resume"),
+                       _: dict = Depends(access_token_bearer)):
+    # checked up front so a bad cursor is a 400 rather than a broken stream
+    after = decode_export_cursor(cursor) if cursor else None
+
+    async def lines():
+        async with read_session_maker()() as session:
+            first = True
+            async for records in book_service.export_books(session, after):
+                yield to_ndjson(records) if format == "ndjson" else to_csv(records, header=first)
+                first = False
+
+            if first and format == "csv":
+                yield to_csv([], header=True)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson" if format == "ndjson" else "text/csv",
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'},
+    )
+
+
 @book_router.get("/{book_uid}", response_model= BookDetailModel,dependencies=[role_checker])
-async def get_a_book(book_uid: str,
-                     session: AsyncSession= Depends(get_session),
-                     token_details: dict =Depends(access_token_bearer)):
+async def get_a_book(book_uid: uuid.UUID,
+                     request: Request,
+                     session: AsyncSession= Depends(get_read_session),
+                     token_details: dict =Depends(access_token_bearer),
+                     validators: dict = Depends(conditional(book_key("{book_uid}"), fallback=BOOKS))):
     
-    book = await book_service.get_book(book_uid, session)
+    # the cache is only filled from the primary, so hits are as new as the validator
+    cached = await book_detail_cache.get(str(book_uid))
+    if cached == MISSING:
+        raise BookNotFound()
+    if cached is not None:
+        return packed_response(cached, request.headers.get("accept-encoding", ""), headers=validators)
+
+    # a replica may be behind the validator and a write's invalidation, so
+    # what it returns is sent without either and never cached
+    primary = reads_primary(session)
+    book = await book_service.get_book(book_uid, session, load=BOOK_DETAIL)
     if book:
-        return book
+        payload = BookDetailModel.model_validate(book, from_attributes=True).model_dump_json()
+        if not primary:
+            return Response(content=payload, media_type="application/json")
+        stored = await book_detail_cache.set(str(book_uid), payload.encode())
+        return packed_response(stored, request.headers.get("accept-encoding", ""), headers=validators)
     else: 
+        if primary:
+            await book_detail_cache.set_missing(str(book_uid))
         raise BookNotFound()
     #raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found")
 
 @book_router.patch("/{book_uid}", dependencies=[role_checker])
-async def update_book(book_uid: str, update_book: BookUpdateModel, 
+async def update_book(book_uid: uuid.UUID, update_book: BookUpdateModel, 
                       session: AsyncSession= Depends(get_session),
                       token_details: dict =Depends(access_token_bearer)):
     update_book = await book_service.update_book(book_uid, update_book, session)
@@ -74,7 +206,7 @@ async def update_book(book_uid: str, update_book: BookUpdateModel,
                     status_code=status.HTTP_204_NO_CONTENT,
                     dependencies=[role_checker]
                     )
-async def delete_book(book_uid: str, 
+async def delete_book(book_uid: uuid.UUID, 
                       session: AsyncSession= Depends(get_session),
                       token_details: dict =Depends(access_token_bearer)):
     
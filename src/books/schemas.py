@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from pydantic import BaseModel
 import uuid
 from datetime import datetime, date
@@ -15,6 +15,10 @@ class Books(BaseModel):
     language: str
     created_at: datetime
     updated_at: datetime
+    review_count: int = 0
+    rating_sum: int = 0
+    average_rating: float = 0.0
+    rating_histogram: Dict[str, int] = {}
 
 class BookCreateModel(BaseModel):
     title: str
@@ -33,4 +37,17 @@ class BookUpdateModel(BaseModel):
     title: str
     publisher: str
     page_count: int
-    language: str
\ No newline at end of file
+    language: str
+
+
+class BookCard(BaseModel):
+    uid: uuid.UUID
+    title: str
+    author: str
+    publisher: str
+    language: str
+
+
+class LeaderboardEntry(BaseModel):
+    book: BookCard
+    score: float
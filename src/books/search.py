@@ -0,0 +1,64 @@
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import Float, Update, func, literal_column, select, update
+from sqlalchemy.dialects.postgresql import TSVECTOR, to_tsvector, websearch_to_tsquery
+
+from src.db.models import Books, BookTag, Tag
+
+# "simple" skips stemming and stop words: the catalogue mixes languages,
+# and an English stemmer would mangle French or German titles
+SEARCH_CONFIG = "simple"
+
+books_table = Books.__table__
+search_vector = books_table.c.search_vector
+
+
+def _weighted(value: Any, weight: str) -> Any:
+    return func.setweight(
+        to_tsvector(SEARCH_CONFIG, func.coalesce(value, "")),
+        literal_column(f"'{weight}'"),
+        type_=TSVECTOR,
+    )
+
+
+def search_document() -> Any:
+    """The tsvector of a book: title, then author, tag names and publisher"""
+    tag_names = (
+        select(func.string_agg(Tag.name, " "))
+        .join(BookTag, BookTag.tag_id == Tag.uid)
+        .where(BookTag.book_id == books_table.c.uid)
+        .scalar_subquery()
+    )
+
+    return (
+        _weighted(books_table.c.title, "A")
+        .op("||")(_weighted(books_table.c.author, "B"))
+        .op("||")(_weighted(tag_names, "C"))
+        .op("||")(_weighted(books_table.c.publisher, "D"))
+    )
+
+
+def update_search_vectors(*where: Any) -> Update:
+    return update(books_table).where(*where).values(search_vector=search_document())
+
+
+def matching_books(book_uids: Any) -> Any:
+    """Books whose uid is in `book_uids`, a list of uids or a uid subquery"""
+    return books_table.c.uid.in_(book_uids)
+
+
+def search_terms(query: str, language: Optional[str] = None) -> tuple:
+    """The rank expression and filters for a search query"""
+    tsquery = websearch_to_tsquery(SEARCH_CONFIG, query)
+    rank = func.ts_rank_cd(search_vector, tsquery, type_=Float)
+
+    where = [search_vector.op("@@")(tsquery)]
+    if language:
+        where.append(Books.language == language)
+
+    return rank, where
+
+
+async def refresh_search_vectors(session: Any, book_uids: Iterable[Any]) -> None:
+    """Rebuild the search vectors of `book_uids` in the session's transaction"""
+    await session.exec(update_search_vectors(matching_books(book_uids)))
@@ -1,35 +1,89 @@
 from datetime import datetime
-from typing import Union
-from sqlmodel import desc, select
+import hashlib
+import logging
+from typing import AsyncIterator, List, Optional, Sequence, Union
+import uuid
+
+from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
+from src.cache import book_detail_cache
+from src.config import Config
+from src.db.loading import BOOK_DELETE, load_options
 from src.db.models import Books
+from src.pagination import Page, PageParams, paginate
+from src.watermarks import BOOKS, book_key, watermarks
+from .bulk import copy_into_books, iter_lines, iter_rows, validate_row
+from .export import export_record, export_statement
+from .search import refresh_search_vectors, search_terms
 from .schemas import BookCreateModel, BookUpdateModel
 
+BOOK_PAGE_KEYS = (Books.created_at, Books.uid)
+# list orders, each backed by an index on its keys
+BOOK_SORTS = {
+    "newest": BOOK_PAGE_KEYS,
+    "most_reviewed": (Books.review_count, Books.uid),
+    "top_rated": (Books.average_rating, Books.uid),
+}
+
 
 class BookService:
-    async def get_all_books(self, session: AsyncSession):
-        statement = select(Books).order_by(desc(Books.created_at))
+    async def get_all_books(
+        self,
+        session: AsyncSession,
+        params: PageParams,
+        sort: str = "newest",
+        columns: Sequence = (),
+    ) -> Page:
+        # "newest" keeps the empty tag so cursors issued before sorting existed still work
+        return await paginate(
+            session,
+            Books,
+            params,
+            keys=BOOK_SORTS[sort],
+            tag="" if sort == "newest" else sort,
+            columns=columns,
+        )
 
-        result = await session.exec(statement)
+    async def get_user_books(
+        self, user_uid: str, session: AsyncSession, params: PageParams, columns: Sequence = ()
+    ) -> Page:
+        return await paginate(
+            session,
+            Books,
+            params,
+            keys=BOOK_PAGE_KEYS,
+            where=[Books.user_uid == user_uid],
+            columns=columns,
+        )
 
-        return result.all()
+    async def search_books(
+        self,
+        query: str,
+        session: AsyncSession,
+        params: PageParams,
+        language: Optional[str] = None,
+        columns: Sequence = (),
+    ) -> Page:
+        """Books matching a web-search style query, best match first"""
+        rank, where = search_terms(query, language)
+        # cursors carry a rank, which is only meaningful for the same search
+        tag = "search:" + hashlib.sha256(f"{query}\0{language}".encode()).hexdigest()[:16]
+
+        return await paginate(
+            session, Books, params, keys=(rank, Books.uid), where=where, tag=tag, columns=columns
+        )
 
-    async def get_user_books(self, user_uid: str, session: AsyncSession):
+    async def get_book(
+        self, book_uid: str, session: AsyncSession, load: Sequence[str] = ()
+    )-> Union[Books, None]:
         statement = (
             select(Books)
-            .where(Books.user_uid == user_uid)
-            .order_by(desc(Books.created_at))
+            .where(Books.uid == book_uid)
+            .options(*load_options(Books, load))
         )
 
         result = await session.exec(statement)
 
-        return result.all()
-
-    async def get_book(self, book_uid: str, session: AsyncSession)-> Union[Books, None]:
-        statement = select(Books).where(Books.uid == book_uid)
-
-        result = await session.exec(statement)
-
         book = result.first()
 
         return book if book else None
@@ -47,8 +101,11 @@ class BookService:
 
         new_book.user_uid = user_uid
         session.add(new_book)
+        await session.flush()
+        await refresh_search_vectors(session, [new_book.uid])
 
         await session.commit()
+        await watermarks.bump(BOOKS)
 
         return new_book
 
@@ -62,19 +119,98 @@ class BookService:
 
             for k, v in update_data_dict.items():
                 setattr(book_to_update, k, v)
+            book_to_update.updated_at = datetime.now()
 
+            await session.flush()
+            await refresh_search_vectors(session, [book_to_update.uid])
             await session.commit()
+            await book_detail_cache.invalidate(str(book_uid))
+            await watermarks.bump(BOOKS, book_key(book_uid))
 
             return book_to_update
         else:
             return None
 
     async def delete_book(self, book_uid: str, session: AsyncSession):
-        book_to_delete = await self.get_book(book_uid, session)
+        # the unit of work has to see the children to detach them
+        book_to_delete = await self.get_book(book_uid, session, load=BOOK_DELETE)
 
         if book_to_delete:
             await session.delete(book_to_delete)
             await session.commit()
+            await book_detail_cache.invalidate(str(book_uid))
+            await watermarks.bump(BOOKS, book_key(book_uid))
             return {}
         else:
-            return None
\ No newline at end of file
+            return None
+
+    async def import_books(
+        self,
+        body: AsyncIterator[bytes],
+        format: str,
+        user_uid: str,
+        session: AsyncSession,
+    ) -> AsyncIterator[dict]:
+        """Validate and load a streamed NDJSON or CSV catalogue.
+
+        Yields one result per rejected line as it is found, one per
+        committed chunk, and a final summary. A database error stops the
+        import; chunks committed before it stay in place.
+        """
+        owner = uuid.UUID(str(user_uid))
+        chunk, imported, rejected = [], 0, 0
+
+        async def flush() -> bool:
+            try:
+                await copy_into_books(session, chunk)
+                await session.commit()
+                await watermarks.bump(BOOKS)
+                return True
+            except Exception as e:
+                logging.exception(e)
+                await session.rollback()
+                return False
+
+        async for line_no, row, error in iter_rows(iter_lines(body), format):
+            record, errors = (None, [{"msg": error}]) if error else validate_row(row, owner)
+
+            if record is None:
+                rejected += 1
+                yield {"line": line_no, "errors": errors}
+                continue
+
+            chunk.append(record)
+            if len(chunk) < Config.BOOK_IMPORT_CHUNK_SIZE:
+                continue
+
+            if not await flush():
+                yield {"error": "import aborted", "imported": imported}
+                return
+            imported += len(chunk)
+            chunk = []
+            yield {"committed": imported}
+
+        if chunk:
+            if not await flush():
+                yield {"error": "import aborted", "imported": imported}
+                return
+            imported += len(chunk)
+            yield {"committed": imported}
+
+        yield {"imported": imported, "rejected": rejected}
+
+    async def export_books(
+        self, session: AsyncSession, after: Optional[tuple] = None
+    ) -> AsyncIterator[List[dict]]:
+        """Stream the catalogue in batches through a server-side cursor.
+
+        Only one batch of rows is held at a time, whatever the table size.
+        """
+        statement = export_statement(after).execution_options(
+            yield_per=Config.BOOK_EXPORT_BATCH_SIZE
+        )
+
+        result = await session.stream(statement)
+
+        async for rows in result.partitions():
+            yield [export_record(row) for row in rows]
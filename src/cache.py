@@ -0,0 +1,91 @@
+import logging
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from src.compression import pack
+from src.config import Config
+from src.db.redis import redis_client
+from src.metrics import cache_lookups
+
+# stored for uids that are known not to exist; never a valid JSON body
+MISSING = b""
+
+
+class ResponseCache:
+    """Serialized response bodies in Redis, keyed by resource id.
+
+    Bodies are stored packed, compressed with RESPONSE_CACHE_ENCODING once
+    they reach COMPRESSION_MINIMUM_SIZE, so a hit can go out without being
+    compressed again; see `src.compression.packed_response`.
+
+    A failing Redis only costs the cache: reads count as misses and writes
+    are skipped, so routes keep serving from the database.
+    """
+
+    def __init__(self, namespace: str, ttl: int, missing_ttl: int) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """The packed body, MISSING for a known-absent resource, or None"""
+        try:
+            payload = await redis_client.get(self._key(key))
+        except RedisError as e:
+            logging.warning("%s cache read failed: %s", self.namespace, e)
+            payload = None
+
+        if payload is None:
+            self.misses += 1
+            cache_lookups.labels(self.namespace, "miss").inc()
+        else:
+            self.hits += 1
+            cache_lookups.labels(self.namespace, "hit").inc()
+
+        return payload
+
+    async def set(self, key: str, payload: bytes) -> bytes:
+        """Cache `payload` and return it packed, as a later get would"""
+        stored = pack(payload, Config.RESPONSE_CACHE_ENCODING, Config.COMPRESSION_MINIMUM_SIZE)
+        try:
+            await redis_client.set(self._key(key), stored, ex=self.ttl)
+        except RedisError as e:
+            logging.warning("%s cache write failed: %s", self.namespace, e)
+
+        return stored
+
+    async def set_missing(self, key: str) -> None:
+        try:
+            await redis_client.set(self._key(key), MISSING, ex=self.missing_ttl)
+        except RedisError as e:
+            logging.warning("%s cache write failed: %s", self.namespace, e)
+
+    async def invalidate(self, *keys: str) -> None:
+        if not keys:
+            return
+
+        try:
+            await redis_client.delete(*[self._key(key) for key in keys])
+        except RedisError as e:
+            # the write already committed; the entry will age out with its ttl
+            logging.error("%s cache invalidation failed for %s: %s", self.namespace, ", ".join(keys), e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+book_detail_cache = ResponseCache(
+    "book_detail", ttl=Config.BOOK_CACHE_TTL, missing_ttl=Config.BOOK_CACHE_MISSING_TTL
+)
@@ -1,19 +1,139 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Optional
+
 from celery import Celery
-from src.mail import mail, create_message
-from asgiref.sync import async_to_sync # for support for cleery async task
+from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from src.config import Config
+from src.mail import deliver, domain_limiter, smtp_pool
+from src.books.leaderboards import leaderboards
+from src.reviews.aggregates import reconcile_ratings
 
 c_app = Celery()
 
 c_app.config_from_object("src.config")
 
 
+class WorkerLoop:
+    """An event loop that lives as long as the worker process.
+
+    Tasks hand it coroutines instead of spinning up a loop per call, so
+    anything bound to a loop - pooled SMTP sessions in particular - is
+    reused across tasks. The loop runs in a daemon thread started on first
+    use, after the prefork pool has forked the process.
+    """
+
+    def __init__(self) -> None:
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return self._loop
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure()).result()
+
+    def stop(self) -> None:
+        if self._loop is not None and self._pid == os.getpid():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+
+worker_loop = WorkerLoop()
+_task_engine: Optional[AsyncEngine] = None
+
+
+def task_engine() -> AsyncEngine:
+    """A one-connection engine for tasks run on the worker loop.
+
+    Its connection belongs to that loop, so it is kept between tasks
+    instead of being opened and closed by every run.
+    """
+    global _task_engine
+
+    if _task_engine is None:
+        _task_engine = create_async_engine(
+            Config.DATABASE_URL,
+            pool_size=1,
+            max_overflow=0,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+
+    return _task_engine
+
+
+@worker_process_shutdown.connect
+def close_worker_loop(**kwargs):
+    if worker_loop._loop is not None:
+        worker_loop.run(smtp_pool.close())
+        if _task_engine is not None:
+            worker_loop.run(_task_engine.dispose())
+    worker_loop.stop()
+
+
+@c_app.task(bind=True, max_retries=Config.MAIL_MAX_RETRIES)
+def send_email(self, recipients: list[str], subject: str, body: str):
+    retry, rejected = worker_loop.run(
+        deliver(recipients, subject, body, smtp_pool, domain_limiter)
+    )
+
+    for recipient, reason in rejected.items():
+        logging.error("email to %s rejected: %s", recipient, reason)
+
+    if retry:
+        # only the recipients that failed go round again
+        raise self.retry(
+            args=[retry, subject, body], countdown=30 * 2 ** self.request.retries
+        )
+
+    logging.info("email sent to %d of %d recipients", len(recipients) - len(rejected), len(recipients))
+
+
+def queue_email(recipients: list[str], subject: str, body: str) -> None:
+    """Fan a recipient list out over tasks of MAIL_CHUNK_SIZE recipients each"""
+    for start in range(0, len(recipients), Config.MAIL_CHUNK_SIZE):
+        send_email.delay(recipients[start:start + Config.MAIL_CHUNK_SIZE], subject, body)
+
+
+c_app.conf.beat_schedule = {
+    "reconcile-rating-aggregates": {
+        "task": "src.celery_tasks.reconcile_rating_aggregates",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "rebuild-leaderboards": {
+        "task": "src.celery_tasks.rebuild_leaderboards",
+        "schedule": crontab(minute="*/15"),
+    },
+}
+
+
+async def _with_connection(work):
+    async with task_engine().connect() as conn:
+        return await work(conn)
+
+
 @c_app.task()
-def send_email(recipients: list[str], subject: str, body: str):
+def reconcile_rating_aggregates(batch_size: int = 5000):
+    """Backfill or repair the rating counters kept on books"""
+    fixed = worker_loop.run(
+        _with_connection(lambda conn: reconcile_ratings(conn, batch_size))
+    )
+    logging.info("rating aggregates reconciled, %d books fixed", fixed)
 
-    message = create_message(recipients=recipients, subject=subject, body=body)
 
-    # since celery is a synchronous fucntion we need
-    # to convert the sync code to async function to be able to
-    # run in a sync task
-    async_to_sync(mail.send_message)(message)
-    print("Email sent")
\ No newline at end of file
+@c_app.task()
+def rebuild_leaderboards():
+    """Recompute the trending and top-rated boards from Postgres"""
+    sizes = worker_loop.run(_with_connection(leaderboards.rebuild))
+    logging.info("leaderboards rebuilt: %s", sizes)
@@ -0,0 +1,223 @@
+import gzip
+from typing import Dict, List, Optional, Tuple
+import zlib
+
+from fastapi.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# in order of preference when a client accepts several equally
+ENCODINGS = tuple(
+    name for name, module in (("zstd", zstandard), ("br", brotli), ("gzip", gzip)) if module is not None
+)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# responses are compressed while the client waits, so favour speed
+LEVELS = {"gzip": 6, "br": 5, "zstd": 3}
+# cache entries are compressed once and sent many times
+CACHE_LEVELS = {"gzip": 9, "br": 9, "zstd": 19}
+
+# prefix of a packed cache entry; a JSON body never starts with NUL
+PACKED = b"\x00"
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Encodings named in an Accept-Encoding header, with their q-values"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def ranked_encodings(accept_encoding: str) -> List[str]:
+    """The encodings both sides support, best first"""
+    accepted = accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+
+    qualities = {name: accepted.get(name, wildcard) for name in ENCODINGS}
+    # sorted() is stable, so equal q-values keep the order of ENCODINGS
+    return sorted((name for name, q in qualities.items() if q > 0), key=lambda name: -qualities[name])
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """The best encoding both sides support, or None to send the body as is"""
+    ranked = ranked_encodings(accept_encoding)
+    return ranked[0] if ranked else None
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    level = LEVELS[encoding] if level is None else level
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "br":
+        return brotli.decompress(data)
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+class StreamCompressor:
+    """Compresses a streamed body chunk by chunk, flushing after each one so
+    the client can decode what it has received so far"""
+
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        level = LEVELS[encoding]
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(level, wbits=31)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._compressor.flush(zlib.Z_FINISH)
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def pack(body: bytes, encoding: str, minimum_size: int) -> bytes:
+    """A body as it is kept in the response cache: compressed with `encoding`
+    once it reaches `minimum_size`, as is below that"""
+    if len(body) < minimum_size or encoding not in ENCODINGS:
+        return body
+    return PACKED + encoding.encode() + PACKED + compress(body, encoding, CACHE_LEVELS[encoding])
+
+
+def unpack(stored: bytes) -> Tuple[Optional[str], bytes]:
+    if not stored.startswith(PACKED):
+        return None, stored
+    encoding, _, body = stored[1:].partition(PACKED)
+    return encoding.decode(), body
+
+
+def packed_response(
+    stored: bytes,
+    accept_encoding: str,
+    media_type: str = "application/json",
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Send a packed cache entry as stored if the client accepts its encoding.
+
+    Otherwise it is decompressed here, and CompressionMiddleware may still
+    compress it with an encoding the client does accept.
+    """
+    encoding, body = unpack(stored)
+    if encoding is None:
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    if accepted_encodings(accept_encoding).get(encoding, 0.0) > 0:
+        headers = {**(headers or {}), "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    return Response(content=decompress(body, encoding), media_type=media_type, headers=headers)
+
+
+class CompressionMiddleware:
+    """Negotiated zstd, brotli or gzip compression of text and JSON responses.
+
+    Bodies sent in one piece are compressed when they reach `minimum_size`;
+    streamed bodies are always compressed, a chunk at a time. Responses that
+    already carry a Content-Encoding, such as packed cache entries, pass
+    through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES)
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if passthrough or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                else:
+                    headers["Content-Encoding"] = encoding
+                    if "accept-encoding" not in headers.get("vary", "").lower():
+                        headers.add_vary_header("Accept-Encoding")
+                    if more_body:
+                        del headers["Content-Length"]
+                        compressor = StreamCompressor(encoding)
+                    else:
+                        body = compress(body, encoding)
+                        headers["Content-Length"] = str(len(body))
+                await send(start)
+                start = None
+
+            if passthrough:
+                await send(message)
+            elif compressor is not None:
+                body = compressor.compress(body) if body else b""
+                if not more_body:
+                    body += compressor.finish()
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+            else:
+                await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
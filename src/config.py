@@ -1,9 +1,25 @@
+from typing import Dict, List, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import EmailStr
 
 # for postgres
 class Settings(BaseSettings):
     DATABASE_URL : str
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_PGBOUNCER: bool = False
+    DATABASE_REPLICA_URLS: List[str] = []
+    DB_READ_YOUR_WRITES_SECONDS: int = 5
+    DB_QUERY_BUDGET: Optional[int] = 20
+    DB_QUERY_BUDGETS: Dict[str, Optional[int]] = {"/api/v1/books/import": None}
+    DB_QUERY_BUDGET_STRICT: bool = False
+    LOG_LEVEL: str = "INFO"
     JWT_SECRET: str
     JWT_ALGORITHM: str
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -15,7 +31,52 @@ class Settings(BaseSettings):
     MAIL_PORT: int
     MAIL_FROM: str
     MAIL_FROM_NAME:str
+    MAIL_STARTTLS: bool = True
+    MAIL_SSL_TLS: bool = False
+    MAIL_USE_CREDENTIALS: bool = True
+    MAIL_VALIDATE_CERTS: bool = True
+    SMTP_POOL_SIZE: int = 4
+    SMTP_IDLE_TIMEOUT: float = 60.0
+    MAIL_CHUNK_SIZE: int = 100
+    MAIL_DOMAIN_RATE: float = 5.0
+    MAIL_DOMAIN_BURST: int = 10
+    MAIL_MAX_RETRIES: int = 3
     DOMAIN:str
+    TOKEN_CACHE_SIZE: int = 10_000
+    HASH_WORKERS: int = 2
+    HASH_QUEUE_LIMIT: int = 64
+    BOOK_CACHE_TTL: int = 300
+    BOOK_CACHE_MISSING_TTL: int = 30
+    BOOK_IMPORT_CHUNK_SIZE: int = 5000
+    BOOK_IMPORT_SPOOL_SIZE: int = 8 * 1024 * 1024
+    BOOK_IMPORT_MAX_SIZE: int = 256 * 1024 * 1024
+    BOOK_EXPORT_BATCH_SIZE: int = 1000
+    FAST_JSON_RESPONSES: bool = False
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    RESPONSE_CACHE_ENCODING: str = "gzip"
+    WATERMARK_TTL: int = 7 * 24 * 3600
+    # addresses, networks or "*" of the reverse proxies in front of the app;
+    # X-Forwarded-For is only believed from them, e.g. '["10.0.0.0/8"]'
+    TRUSTED_PROXIES: List[str] = []
+    RATE_LIMIT_ENABLED: bool = True
+    # "<count>/<second|minute|hour>" by route template, for each client "ip",
+    # each signed-in "user" and the "route" as a whole; count is also the burst
+    RATE_LIMITS: Dict[str, Dict[str, str]] = {
+        "/api/v1/auth/login": {"ip": "10/minute", "route": "10/second"},
+        "/api/v1/auth/signup": {"ip": "5/minute", "route": "5/second"},
+        "/api/v1/auth/send_mail": {"ip": "5/minute", "route": "5/second"},
+        "/api/v1/auth/password-reset-request": {"ip": "5/minute", "route": "5/second"},
+        "/api/v1/reviews/book/{book_uid}": {"user": "30/minute", "ip": "60/minute", "route": "100/second"},
+    }
+    # fill the DB pools, prepare the hot statements and start the hash
+    # workers before taking traffic; each step gives up after the timeout
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT: float = 10.0
+    LEADERBOARD_SIZE: int = 1000
+    TRENDING_HALF_LIFE_HOURS: float = 24.0
+    TRENDING_WINDOW_DAYS: int = 7
+    TOP_RATED_PRIOR_REVIEWS: int = 10
+    TOP_RATED_PRIOR_MEAN: float = 2.0
     model_config = SettingsConfigDict(
         env_file =".env",
         extra ="ignore",
@@ -0,0 +1,93 @@
+from contextvars import ContextVar
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config import Config
+from src.metrics import db_queries_per_request
+
+logger = logging.getLogger("bookworm.sql")
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more SQL statements than its route is allowed"""
+
+    pass
+
+
+class QueryStats:
+    """Statements, rows and database time spent on behalf of one request"""
+
+    __slots__ = ("count", "rows", "duration")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.rows = 0
+        self.duration = 0.0
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries, {self.rows} rows"'
+
+
+# set by the request middleware; statements run outside a request, from
+# celery tasks or scripts, find None here and are not counted
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info["query_started"].pop()
+    stats = current_stats.get()
+    if stats is None:
+        return
+
+    stats.count += 1
+    # as the driver reports them: asyncpg counts SELECTed rows, sqlite does not
+    stats.rows += max(cursor.rowcount, 0)
+    stats.duration += time.perf_counter() - started
+
+
+def _on_error(context) -> None:
+    # a failed statement never reaches after_cursor_execute
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def track_queries(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_execute)
+    event.listen(engine.sync_engine, "handle_error", _on_error)
+
+
+def query_budget(route: str) -> Optional[int]:
+    return Config.DB_QUERY_BUDGETS.get(route, Config.DB_QUERY_BUDGET)
+
+
+def check_budget(stats: QueryStats, method: str, route: str) -> None:
+    """Log what a finished request cost and hold it to its route's budget.
+
+    Going over the budget raises with DB_QUERY_BUDGET_STRICT, which the
+    tests turn on, and only warns otherwise.
+    """
+    db_queries_per_request.labels(method, route).observe(stats.count)
+    logger.debug(
+        "%s %s ran %d queries returning %d rows in %.1fms",
+        method, route, stats.count, stats.rows, stats.duration * 1000,
+        extra={"queries": stats.count, "rows": stats.rows, "db_ms": round(stats.duration * 1000, 3)},
+    )
+
+    budget = query_budget(route)
+    if budget is None or stats.count <= budget:
+        return
+
+    message = f"{method} {route} ran {stats.count} queries, over its budget of {budget}"
+    if Config.DB_QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
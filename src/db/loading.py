@@ -0,0 +1,15 @@
+from typing import Any, List, Sequence
+
+from sqlalchemy.orm import selectinload
+
+# Relationships are declared with lazy="raise_on_sql", so nothing is loaded
+# unless a service method asks for it. These are the sets routes ask for.
+BOOK_DETAIL = ("reviews",)
+BOOK_DELETE = ("reviews", "tags")
+USER_PROFILE = ("books", "reviews")
+
+
+def load_options(model: Any, relationships: Sequence[str]) -> List[Any]:
+    """Batched eager-load options for the named relationships of `model`"""
+
+    return [selectinload(getattr(model, name)) for name in relationships]
@@ -1,14 +1,128 @@
-from sqlmodel import create_engine, text, SQLModel
-from sqlalchemy.ext.asyncio import AsyncEngine
+import hashlib
+import itertools
+import logging
+import time
+import uuid
+
+from fastapi import Request
+from redis.exceptions import RedisError
+from sqlmodel import text, SQLModel
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlmodel.ext.asyncio.session import AsyncSession 
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.orm.session import Session
 from src.config import Config
+from src.db.accounting import track_queries
+from src.db.redis import redis_client
+from src.metrics import db_pool_capacity, db_pool_checked_out, db_pool_wait
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that also records how long callers wait for a connection"""
+
+    # which engine this pool belongs to, as a metrics label
+    label = "primary"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            db_pool_wait.labels(self.label).observe(waited)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+
+def _connect_args() -> dict:
+    if Config.DB_PGBOUNCER:
+        # pgbouncer in transaction mode hands each transaction a different
+        # backend, so server-side prepared statements must not be reused
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+
+    return {"statement_cache_size": Config.DB_STATEMENT_CACHE_SIZE}
+
+
+def _create_engine(url: str, label: str) -> AsyncEngine:
+    engine = create_async_engine(
+        url=url,
+        echo=Config.DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+        connect_args=_connect_args(),
+    )
+    engine.pool.label = label
+    db_pool_capacity.labels(label).set(Config.DB_POOL_SIZE + Config.DB_MAX_OVERFLOW)
+
+    # listeners on the engine outlive the pool being recreated by dispose()
+    checked_out = db_pool_checked_out.labels(label)
+    event.listen(engine.sync_engine, "checkout", lambda *args: checked_out.inc())
+    event.listen(engine.sync_engine, "checkin", lambda *args: checked_out.dec())
+    track_queries(engine)
+
+    return engine
+
+
+def _create_session_maker(engine: AsyncEngine, replica: bool = False) -> sessionmaker:
+    return sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        info={"replica": replica},
+    )
+
+
+async_engine = _create_engine(Config.DATABASE_URL, "primary")
+async_session_maker = _create_session_maker(async_engine)
+
+replica_engines = [
+    _create_engine(url, f"replica{i}") for i, url in enumerate(Config.DATABASE_REPLICA_URLS)
+]
+_replica_session_makers = itertools.cycle(
+    [_create_session_maker(engine, replica=True) for engine in replica_engines]
+)
 
-async_engine = AsyncEngine(
-    create_engine(
-    url=Config.DATABASE_URL,
-    echo=True,
-))
+
+def pool_stats(engine: AsyncEngine = async_engine) -> dict:
+    """Connection pool usage of `engine` in this worker process.
+
+    Each worker holds its own pool, so the database sees up to
+    workers * (pool_size + max_overflow) connections.
+    """
+    pool = engine.pool
+
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": Config.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": pool.checkouts,
+        "wait_avg_ms": pool.wait_total / pool.checkouts * 1000 if pool.checkouts else 0.0,
+        "wait_max_ms": pool.wait_max * 1000,
+    }
 
 
 async def init_db()-> None:
@@ -20,12 +134,59 @@ async def init_db()-> None:
         # print(result.all())
 
 
-async def get_session() -> AsyncSession:
-    Session = sessionmaker(
-        bind=async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-    )
+@event.listens_for(Session, "after_commit")
+def _flag_commit(session: Session) -> None:
+    session.info["committed"] = True
+
+
+def _client_key(request: Request) -> str:
+    # the bearer token identifies a user's session well enough for a
+    # window of a few seconds; anonymous callers fall back to their address
+    identity = request.headers.get("authorization") or (request.client.host if request.client else "")
+
+    return "recent_write:" + hashlib.sha256(identity.encode()).hexdigest()
+
+
+async def _wrote_recently(request: Request) -> bool:
+    try:
+        return bool(await redis_client.exists(_client_key(request)))
+    except RedisError as e:
+        logging.warning("read-your-writes check failed, reading from primary: %s", e)
+        return True
+
+
+async def _mark_recent_write(request: Request) -> None:
+    try:
+        await redis_client.set(_client_key(request), 1, ex=Config.DB_READ_YOUR_WRITES_SECONDS)
+    except RedisError as e:
+        logging.warning("could not record write for read-your-writes: %s", e)
+
+
+async def get_session(request: Request) -> AsyncSession:
+    """Session on the primary, for routes that write"""
+    async with async_session_maker() as session:
+        yield session
+
+        if replica_engines and session.info.get("committed"):
+            await _mark_recent_write(request)
+
+
+def read_session_maker() -> sessionmaker:
+    """Session factory for the next replica, or the primary without replicas"""
+    return next(_replica_session_makers) if replica_engines else async_session_maker
+
+
+def reads_primary(session: AsyncSession) -> bool:
+    """Whether `session` sees every committed write, i.e. is not on a replica"""
+    return not session.info.get("replica")
+
+
+async def get_read_session(request: Request) -> AsyncSession:
+    """Session on a replica, unless this client wrote within the last few seconds"""
+    if replica_engines and not await _wrote_recently(request):
+        session_maker = read_session_maker()
+    else:
+        session_maker = async_session_maker
 
-    async with Session() as session:
-        yield session
\ No newline at end of file
+    async with session_maker() as session:
+        yield session
@@ -1,18 +1,24 @@
 from datetime import datetime, date
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uuid
 
 import sqlalchemy.dialects.postgresql as pg
+from sqlalchemy import JSON, Float, Index, Integer, Text, UniqueConstraint
 from sqlmodel import SQLModel, Field, Column, Relationship
 
 
 class BookTag(SQLModel, table=True):
+    __table_args__ = (Index("ix_booktag_tag_id", "tag_id"),)
     book_id: uuid.UUID = Field(default=None, foreign_key="books.uid", primary_key=True)
     tag_id: uuid.UUID = Field(default=None, foreign_key="tags.uid", primary_key=True)
 
 
 class Tag(SQLModel, table=True):
     __tablename__ = "tags"
+    __table_args__ = (
+        UniqueConstraint("name", name="uq_tags_name"),
+        Index("ix_tags_created_at_uid", "created_at", "uid"),
+    )
     uid: uuid.UUID = Field(
         sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4)
     )
@@ -21,7 +27,7 @@ class Tag(SQLModel, table=True):
     books: List["Books"] = Relationship(
         link_model=BookTag,
         back_populates="tags",
-        sa_relationship_kwargs={"lazy": "selectin"},
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
     )
 
     def __repr__(self) -> str:
@@ -31,6 +37,16 @@ class Tag(SQLModel, table=True):
 class Books(SQLModel, table=True):
 
     __tablename__ = "books"
+    __table_args__ = (
+        Index("ix_books_created_at_uid", "created_at", "uid"),
+        Index("ix_books_user_uid_created_at_uid", "user_uid", "created_at", "uid"),
+        Index("ix_books_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_books_review_count_uid", "review_count", "uid"),
+        Index("ix_books_average_rating_uid", "average_rating", "uid"),
+    )
+    # maintained by src.books.search and only read by search queries, so it
+    # stays out of the mapper instead of being loaded with every book
+    __mapper_args__ = {"exclude_properties": ["search_vector"]}
 
     uid: uuid.UUID = Field(
         sa_column=Column(
@@ -55,12 +71,31 @@ class Books(SQLModel, table=True):
         pg.TIMESTAMP,
         default=datetime.now
     ))
+    # kept in step with the reviews by src.reviews.aggregates
+    review_count: int = Field(
+        default=0, sa_column=Column(Integer, nullable=False, server_default="0")
+    )
+    rating_sum: int = Field(
+        default=0, sa_column=Column(Integer, nullable=False, server_default="0")
+    )
+    average_rating: float = Field(
+        default=0.0, sa_column=Column(Float, nullable=False, server_default="0")
+    )
+    rating_histogram: Dict[str, int] = Field(
+        default_factory=dict,
+        sa_column=Column(pg.JSONB().with_variant(JSON(), "sqlite"), nullable=False, server_default="{}"),
+    )
+    search_vector: Optional[str] = Field(
+        default=None,
+        sa_column=Column(pg.TSVECTOR().with_variant(Text(), "sqlite"), nullable=True),
+        exclude=True,
+    )
     user: Optional["User"] = Relationship(back_populates="books")
-    reviews: List["Review"] = Relationship(back_populates="books", sa_relationship_kwargs={"lazy": "selectin"})
+    reviews: List["Review"] = Relationship(back_populates="books", sa_relationship_kwargs={"lazy": "raise_on_sql"})
     tags: List[Tag] = Relationship(
         link_model=BookTag,
         back_populates="books",
-        sa_relationship_kwargs={"lazy": "selectin"},
+        sa_relationship_kwargs={"lazy": "raise_on_sql"},
     )
 
     def __repr__(self):
@@ -69,6 +104,7 @@ class Books(SQLModel, table=True):
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
+    __table_args__ = (UniqueConstraint("email", name="uq_users_email"),)
     uid: uuid.UUID = Field(sa_column=Column(
         pg.UUID,
         nullable=False,
@@ -85,6 +121,11 @@ class User(SQLModel, table=True):
         sa_column=Column(pg.VARCHAR, nullable=False),
         exclude=True
     )
+    # tokens carry the version they were issued at; bumping it revokes the
+    # older ones, and src.db.redis caches it for the revocation check
+    token_version: int = Field(
+        default=0, sa_column=Column(Integer, nullable=False, server_default="0")
+    )
     created_at: datetime = Field(
         sa_column=Column(
             pg.TIMESTAMP,
@@ -97,14 +138,19 @@ class User(SQLModel, table=True):
             default=datetime.now
         )
     )
-    books: List["Books"] = Relationship(back_populates="user", sa_relationship_kwargs={"lazy": "selectin"})
-    reviews: List["Review"] = Relationship(back_populates="user", sa_relationship_kwargs={"lazy": "selectin"})
+    books: List["Books"] = Relationship(back_populates="user", sa_relationship_kwargs={"lazy": "raise_on_sql"})
+    reviews: List["Review"] = Relationship(back_populates="user", sa_relationship_kwargs={"lazy": "raise_on_sql"})
     def __repr__(self):
         return f"<User {self.username}>"
     
 
 class Review(SQLModel, table=True):
     __tablename__ = "reviews"
+    __table_args__ = (
+        Index("ix_reviews_book_uid", "book_uid"),
+        Index("ix_reviews_user_uid", "user_uid"),
+        Index("ix_reviews_created_at_uid", "created_at", "uid"),
+    )
     uid: uuid.UUID = Field(
         sa_column=Column(pg.UUID, nullable=False, primary_key=True, default=uuid.uuid4)
     )
@@ -1,7 +1,20 @@
+import asyncio
+from contextlib import contextmanager
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
 from redis import asyncio as aioredis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import RedisError
 from src.config import Config
+from src.metrics import cache_lookups, redis_command_duration, redis_command_errors
 
 JTI_EXPIRY = 3600
+PRINCIPAL_EXPIRY = 60
+TOKEN_VERSION_EXPIRY = 3600
+BLOCKLIST_CHANNEL = "token_blocklist"
+VERSION_PREFIX = "version:"
 
 
 # token_blocklist = aioredis.StrictRedis(
@@ -10,16 +23,212 @@ JTI_EXPIRY = 3600
 #     db=0,
 # )
 
-token_blocklist = aioredis.from_url(
+@contextmanager
+def _timed(command: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except RedisError:
+        redis_command_errors.labels(command).inc()
+        raise
+    finally:
+        redis_command_duration.labels(command).observe(time.perf_counter() - start)
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        with _timed("MULTI" if self.is_transaction else "PIPELINE"):
+            return await super().execute(raise_on_error)
+
+
+class InstrumentedRedis(aioredis.Redis):
+    """Redis client that times every command, and every pipeline as one round trip"""
+
+    async def execute_command(self, *args, **options):
+        with _timed(str(args[0]).upper()):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+redis_client = InstrumentedRedis.from_url(
     url = Config.REDIS_URL)
 
+token_blocklist = redis_client
+
+
+
+
+class BlocklistMirror:
+    """In-process copy of the revocations made while this worker was listening.
+
+    Every `add_jti_to_blocklist` publishes the JTI, and every
+    `publish_token_version` the user's new version, on BLOCKLIST_CHANNEL, so a
+    worker that has been subscribed since some moment has seen every
+    revocation made after it. `live_since` is that moment, or None while the
+    subscription is down.
+    """
+
+    def __init__(self) -> None:
+        self._revoked: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}
+        self.live_since: Optional[float] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def add(self, jti: str) -> None:
+        now = time.monotonic()
+        if len(self._revoked) > 10_000:
+            self._revoked = {k: exp for k, exp in self._revoked.items() if exp > now}
+        self._revoked[jti] = now + JTI_EXPIRY
+
+    def add_version(self, user_uid: str, version: int) -> None:
+        if len(self._versions) > 10_000:
+            # versions never expire, so start over and stop vouching for
+            # tokens checked before now; they go back to redis once
+            self._versions = {}
+            if self.live_since is not None:
+                self.live_since = time.monotonic()
+        self._versions[user_uid] = max(version, self._versions.get(user_uid, 0))
+
+    def __contains__(self, jti: str) -> bool:
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def outdated(self, user_uid: str, version: int) -> bool:
+        """True if the user's tokens of `version` were revoked while listening"""
+        return version < self._versions.get(user_uid, 0)
+
+    def covers(self, since: float) -> bool:
+        """True if every revocation made after `since` has reached this mirror"""
+        return self.live_since is not None and self.live_since <= since
+
+    def start(self) -> None:
+        listener = self._listener
+        if listener is None or listener.done() or listener.get_loop() is not asyncio.get_running_loop():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        self.live_since = None
+
+    def _receive(self, data: str) -> None:
+        # JTIs are uuids, so they never start with the prefix
+        if data.startswith(VERSION_PREFIX):
+            user_uid, _, version = data[len(VERSION_PREFIX):].rpartition(":")
+            self.add_version(user_uid, int(version))
+        else:
+            self.add(data)
 
+    async def _listen(self) -> None:
+        backoff = 1
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(BLOCKLIST_CHANNEL)
+                self.live_since = time.monotonic()
+                backoff = 1
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._receive(message["data"].decode())
+            except RedisError as e:
+                logging.warning("blocklist subscription lost: %s", e)
+            finally:
+                self.live_since = None
+                await pubsub.aclose()
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+blocklist_mirror = BlocklistMirror()
 
 
 async def add_jti_to_blocklist(jti: str) -> None:
     await token_blocklist.set(name=jti, value="", ex=JTI_EXPIRY)
+    blocklist_mirror.add(jti)
+    await token_blocklist.publish(BLOCKLIST_CHANNEL, jti)
+
+def _token_version_key(user_uid: str) -> str:
+    return f"token_version:{user_uid}"
+
+
+# The version is kept on the user in Postgres and only cached here, so
+# losing it costs a query rather than the revocation. The cache is only
+# ever raised: a fill read before a bump committed must not undo the
+# bump's own write.
+RAISE_TOKEN_VERSION = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '-1')
+if tonumber(ARGV[1]) > current then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+"""
+
+_raise_token_version = token_blocklist.register_script(RAISE_TOKEN_VERSION)
+
+
+async def cache_token_version(user_uid: str, version: int) -> None:
+    """Cache the user's stored token version, unless a newer one is cached"""
+    await _raise_token_version(
+        keys=[_token_version_key(user_uid)], args=[version, TOKEN_VERSION_EXPIRY]
+    )
+
+
+async def publish_token_version(user_uid: str, version: int) -> None:
+    """Revoke the user's tokens older than `version`, already stored on the user"""
+    await cache_token_version(user_uid, version)
+    blocklist_mirror.add_version(user_uid, version)
+    await token_blocklist.publish(BLOCKLIST_CHANNEL, f"{VERSION_PREFIX}{user_uid}:{version}")
+
+
+async def token_revoked(
+    jti: str, user_uid: str, version: int, stored_version: Callable[[], Awaitable[int]]
+) -> bool:
+    """Whether the token was logged out or its user's tokens revoked, in one
+    round trip while the user's version is cached. `stored_version` reads
+    it from Postgres otherwise."""
+    blocked, current = await token_blocklist.mget(jti, _token_version_key(user_uid))
+    if blocked is not None:
+        return True
+
+    if current is None:
+        current = await stored_version()
+        try:
+            await cache_token_version(user_uid, current)
+        except RedisError as e:
+            logging.warning("token version cache fill failed: %s", e)
+
+    return version < int(current)
+
+
+def _principal_key(email: str) -> str:
+    return f"principal:{email}"
+
+
+async def get_cached_principal(email: str) -> Optional[bytes]:
+    # the cache only saves a query, so a redis failure falls back to the db
+    try:
+        principal = await redis_client.get(_principal_key(email))
+    except RedisError as e:
+        logging.warning("principal cache read failed: %s", e)
+        principal = None
+
+    cache_lookups.labels("principal", "miss" if principal is None else "hit").inc()
+    return principal
+
+
+async def cache_principal(email: str, principal: str) -> None:
+    try:
+        await redis_client.set(name=_principal_key(email), value=principal, ex=PRINCIPAL_EXPIRY)
+    except RedisError as e:
+        logging.warning("principal cache write failed: %s", e)
 
-async def token_in_blocklist(jti: str) -> bool:
-    jti = await token_blocklist.get(jti)
 
-    return jti is not None
+async def invalidate_principal(email: str) -> None:
+    try:
+        await redis_client.delete(_principal_key(email))
+    except RedisError as e:
+        # the change already committed; the entry ages out with PRINCIPAL_EXPIRY
+        logging.error("principal cache invalidation failed: %s", e)
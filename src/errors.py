@@ -76,6 +76,32 @@ class UserNotFound(BooklyException):
     pass
 
 
+class InvalidCursor(BooklyException):
+    """User has provided a malformed or mismatched pagination cursor"""
+
+    pass
+
+
+class ServerBusy(BooklyException):
+    """Too much work is queued for a bounded resource to take more"""
+
+    pass
+
+
+class ImportTooLarge(BooklyException):
+    """User has uploaded an import bigger than BOOK_IMPORT_MAX_SIZE"""
+
+    pass
+
+
+class TooManyRequests(BooklyException):
+    """User has gone over a rate limit"""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
 class AccountNotVerified(Exception):
     """Account not yet verified"""
     pass
@@ -229,6 +255,55 @@ def register_all_errors(app: FastAPI):
         ),
     )
 
+    app.add_exception_handler(
+        InvalidCursor,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_detail={
+                "message": "Invalid pagination cursor",
+                "error_code": "invalid_cursor",
+                "resolution": "Use a cursor returned by the same endpoint or start from the first page",
+            },
+        ),
+    )
+
+    app.add_exception_handler(
+        ServerBusy,
+        create_exception_handler(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            initial_detail={
+                "message": "Server is busy",
+                "error_code": "server_busy",
+                "resolution": "Please retry shortly",
+            },
+        ),
+    )
+
+    app.add_exception_handler(
+        ImportTooLarge,
+        create_exception_handler(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            initial_detail={
+                "message": "Import is too large",
+                "error_code": "import_too_large",
+                "resolution": "Split the file into smaller imports",
+            },
+        ),
+    )
+
+    @app.exception_handler(TooManyRequests)
+    async def too_many_requests(request, exc: TooManyRequests):
+
+        return JSONResponse(
+            content={
+                "message": "Too many requests",
+                "error_code": "rate_limited",
+                "resolution": f"Please retry in {exc.retry_after} seconds",
+            },
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
     @app.exception_handler(500)
     async def internal_server_error(request, exc):
 
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, Response, status
+from fastapi.responses import JSONResponse
+
+from src.auth.dependencies import RoleChecker
+from src.cache import book_detail_cache
+from src.db.main import pool_stats, replica_engines
+from src.resources import readiness
+from src.metrics import latest
+
+health_router = APIRouter()
+metrics_router = APIRouter()
+admin_role_checker = Depends(RoleChecker(["admin"]))
+
+
+@health_router.get("/live")
+async def live():
+    return {"status": "alive"}
+
+
+@health_router.get("/ready")
+async def ready():
+    # a load balancer holds traffic back until the worker has warmed up
+    content = {"status": "ready" if readiness.ready else "warming up", "warmup": readiness.warmup}
+    if not readiness.ready:
+        return JSONResponse(content, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return content
+
+
+@health_router.get("/db-pool", dependencies=[admin_role_checker])
+async def get_pool_stats():
+    return {
+        "primary": pool_stats(),
+        "replicas": [pool_stats(engine) for engine in replica_engines],
+    }
+
+
+
+@health_router.get("/cache", dependencies=[admin_role_checker])
+async def get_cache_stats():
+    return {"book_detail": book_detail_cache.stats()}
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # a plain def: in multiprocess mode collecting reads every worker's files
+    body, content_type = latest()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,59 @@
+import atexit
+from datetime import datetime, timezone
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import sys
+from typing import Optional
+
+# attributes every LogRecord has; anything else was passed in `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with the record's `extra` fields at the top level"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = "INFO") -> None:
+    """Send the root logger's records through a queue to a background thread.
+
+    Logging calls on the event loop only merge the message with its args
+    and put the record on the queue. The listener thread passes it to the
+    stdout handler, whose JSONFormatter renders the line, and that handler
+    does the blocking write.
+    `level` applies to the "bookworm" loggers. Calling this again is a no-op.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONFormatter())
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logging.getLogger().addHandler(QueueHandler(records))
+    # only the app's own loggers are lowered; libraries keep the root's
+    # WARNING, which also keeps SQLAlchemy from echoing every statement
+    logging.getLogger("bookworm").setLevel(level)
@@ -1,32 +1,190 @@
-from fastapi_mail import FastMail, ConnectionConfig, MessageSchema, MessageType
+import asyncio
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formataddr
+from functools import lru_cache
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import aiosmtplib
 from src.config import Config
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
 
 
-mail_config = ConnectionConfig(
-    MAIL_USERNAME=Config.MAIL_USERNAME,
-    MAIL_PASSWORD=Config.MAIL_PASSWORD,
-    MAIL_FROM=Config.MAIL_FROM,
-    MAIL_PORT=Config.MAIL_PORT,
-    MAIL_SERVER=Config.MAIL_SERVER,
-    MAIL_FROM_NAME=Config.MAIL_FROM_NAME,
-    MAIL_STARTTLS=True,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    # TEMPLATE_FOLDER=Path(BASE_DIR, "templates"),
-)
+# fastapi_mail alone takes about a tenth of a second to import and only the
+# commented-out direct sends use it, so it is loaded on first use rather
+# than by every process that imports this module
+@lru_cache(maxsize=None)
+def get_mail():
+    from fastapi_mail import ConnectionConfig, FastMail
 
+    mail_config = ConnectionConfig(
+        MAIL_USERNAME=Config.MAIL_USERNAME,
+        MAIL_PASSWORD=Config.MAIL_PASSWORD,
+        MAIL_FROM=Config.MAIL_FROM,
+        MAIL_PORT=Config.MAIL_PORT,
+        MAIL_SERVER=Config.MAIL_SERVER,
+        MAIL_FROM_NAME=Config.MAIL_FROM_NAME,
+        MAIL_STARTTLS=Config.MAIL_STARTTLS,
+        MAIL_SSL_TLS=Config.MAIL_SSL_TLS,
+        USE_CREDENTIALS=Config.MAIL_USE_CREDENTIALS,
+        VALIDATE_CERTS=Config.MAIL_VALIDATE_CERTS,
+        # TEMPLATE_FOLDER=Path(BASE_DIR, "templates"),
+    )
 
-mail = FastMail(config=mail_config)
+    return FastMail(config=mail_config)
 
 
 def create_message(recipients: list[str], subject: str, body: str):
+    from fastapi_mail import MessageSchema, MessageType
 
     message = MessageSchema(
         recipients=recipients, subject=subject, body=body, subtype=MessageType.html
     )
 
-    return message
\ No newline at end of file
+    return message
+
+class SMTPPool:
+    """Long-lived SMTP sessions shared by every send in a worker process.
+
+    Opening a session costs a TCP connect, STARTTLS and a login; a pooled
+    session only pays for MAIL/RCPT/DATA. Sessions idle for longer than
+    `idle_timeout` are closed rather than reused, since servers drop them.
+    """
+
+    def __init__(self, size: int, idle_timeout: float, **smtp_options) -> None:
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.smtp_options = smtp_options
+        self._idle: List[Tuple[aiosmtplib.SMTP, float]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_config(cls) -> "SMTPPool":
+        return cls(
+            size=Config.SMTP_POOL_SIZE,
+            idle_timeout=Config.SMTP_IDLE_TIMEOUT,
+            hostname=Config.MAIL_SERVER,
+            port=Config.MAIL_PORT,
+            username=Config.MAIL_USERNAME if Config.MAIL_USE_CREDENTIALS else None,
+            password=Config.MAIL_PASSWORD if Config.MAIL_USE_CREDENTIALS else None,
+            use_tls=Config.MAIL_SSL_TLS,
+            start_tls=Config.MAIL_STARTTLS,
+            validate_certs=Config.MAIL_VALIDATE_CERTS,
+        )
+
+    async def _checkout(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            smtp, released_at = self._idle.pop()
+            if smtp.is_connected and time.monotonic() - released_at < self.idle_timeout:
+                return smtp
+            smtp.close()
+
+        smtp = aiosmtplib.SMTP(**self.smtp_options)
+        await smtp.connect()
+        return smtp
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+
+        async with self._slots:
+            smtp = await self._checkout()
+            try:
+                yield smtp
+            finally:
+                # a refused message leaves the session usable; a dropped one does not
+                if smtp.is_connected:
+                    self._idle.append((smtp, time.monotonic()))
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+
+class DomainRateLimiter:
+    """Token bucket per recipient domain.
+
+    Buckets live in the worker process, so the rate a domain sees is
+    `rate` times the number of worker processes.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def wait(self, domain: str) -> None:
+        while True:
+            now = time.monotonic()
+            tokens, stamp = self._buckets.get(domain, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+
+            if tokens >= 1:
+                self._buckets[domain] = (tokens - 1, now)
+                return
+
+            self._buckets[domain] = (tokens, now)
+            await asyncio.sleep((1 - tokens) / self.rate)
+
+
+def build_message(recipient: str, subject: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = formataddr((Config.MAIL_FROM_NAME, Config.MAIL_FROM))
+    message["To"] = recipient
+    message["Subject"] = subject
+    message.set_content(body, subtype="html")
+
+    return message
+
+
+def is_transient(error: Exception) -> bool:
+    """4xx replies and dropped connections are worth retrying; 5xx are not"""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(400 <= refused.code < 500 for refused in error.recipients)
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return 400 <= error.code < 500
+    return isinstance(error, (aiosmtplib.SMTPException, OSError))
+
+
+async def deliver(
+    recipients: Sequence[str],
+    subject: str,
+    body: str,
+    pool: SMTPPool,
+    limiter: DomainRateLimiter,
+) -> Tuple[List[str], Dict[str, str]]:
+    """Send one message per recipient over pooled sessions.
+
+    Every recipient gets its own message, so addresses are never disclosed
+    to each other. Returns the recipients worth retrying and the ones the
+    server rejected for good, with the reason.
+    """
+    retry: List[str] = []
+    rejected: Dict[str, str] = {}
+
+    async def send(recipient: str) -> None:
+        await limiter.wait(recipient.rpartition("@")[2].lower())
+        try:
+            async with pool.connection() as smtp:
+                await smtp.send_message(build_message(recipient, subject, body))
+        except Exception as e:
+            if is_transient(e):
+                retry.append(recipient)
+            else:
+                rejected[recipient] = str(e)
+
+    await asyncio.gather(*[send(recipient) for recipient in recipients])
+
+    return retry, rejected
+
+
+smtp_pool = SMTPPool.from_config()
+domain_limiter = DomainRateLimiter(Config.MAIL_DOMAIN_RATE, Config.MAIL_DOMAIN_BURST)
@@ -0,0 +1,119 @@
+import atexit
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# When PROMETHEUS_MULTIPROC_DIR is set before the app is imported, every
+# worker writes its samples to files in that directory and a scrape of any
+# one worker reports the sum over all of them. The directory must be
+# emptied before the server starts, or counters carry over from the last run.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# routes that did not match anything share one label value, so scanners
+# probing random paths cannot blow up the number of series
+UNMATCHED_ROUTE = "<unmatched>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+http_requests = Counter(
+    "http_requests_total",
+    "HTTP requests handled, by route template and response status",
+    ["method", "route", "status"],
+)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress",
+    "Requests currently being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+db_pool_capacity = Gauge(
+    "db_pool_capacity",
+    "Connections the pool may open, pool_size + max_overflow",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+db_pool_checked_out = Gauge(
+    "db_pool_checked_out",
+    "Connections currently lent out by the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+db_pool_wait = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    ["pool"],
+    buckets=FAST_BUCKETS,
+)
+
+db_queries_per_request = Histogram(
+    "db_queries_per_request",
+    "SQL statements run while handling one request",
+    ["method", "route"],
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+
+redis_command_duration = Histogram(
+    "redis_command_duration_seconds",
+    "Round trip of a Redis command or pipeline",
+    ["command"],
+    buckets=FAST_BUCKETS,
+)
+
+redis_command_errors = Counter(
+    "redis_command_errors_total",
+    "Redis commands or pipelines that raised",
+    ["command"],
+)
+
+rate_limited_requests = Counter(
+    "rate_limited_requests_total",
+    "Requests refused with 429, by route and the limit that ran out",
+    ["route", "scope"],
+)
+
+cache_lookups = Counter(
+    "cache_lookups_total",
+    "Cache reads by outcome; hit ratio is hit / (hit + miss)",
+    ["cache", "result"],
+)
+
+
+def latest() -> tuple:
+    """The current samples in the text exposition format, and its content type"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _mark_process_dead() -> None:
+    # a worker that exits takes its in-flight and pool gauges with it
+    multiprocess.mark_process_dead(os.getpid())
+
+
+if MULTIPROCESS:
+    atexit.register(_mark_process_dead)
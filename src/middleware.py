@@ -1,28 +1,108 @@
-from fastapi import FastAPI, status
-from fastapi.requests import Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 import time
 import logging
 
+from src.compression import CompressionMiddleware
+from src.config import Config
+from src.db.accounting import QueryStats, check_budget, current_stats
+from src.metrics import (
+    UNMATCHED_ROUTE,
+    http_request_duration,
+    http_requests,
+    http_requests_in_progress,
+)
+
 logger = logging.getLogger("uvicorn.access")
 logger.disabled = True
 
+access_logger = logging.getLogger("bookworm.access")
 
-def register_middleware(app: FastAPI):
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class RequestMetricsMiddleware:
+    """Times every request and records it by route template and status.
+
+    Also counts the SQL the request runs: the totals so far go out in a
+    Server-Timing header, and the final ones are checked against the
+    route's query budget.
+
+    A plain ASGI middleware rather than `@app.middleware("http")`, so
+    streaming responses pass through untouched and the time includes
+    sending the whole body.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in METHODS else "OTHER"
+        status_code = 500
+        stats = QueryStats()
 
-    @app.middleware("http")
-    async def custom_logging(request: Request, call_next):
-        start_time = time.time()
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # a streamed body may run more queries after this; the log has them all
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"server-timing", stats.server_timing().encode()),
+                ]
+            await send(message)
 
-        response = await call_next(request)
-        processing_time = time.time() - start_time
+        in_progress = http_requests_in_progress.labels(method)
+        in_progress.inc()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+            current_stats.reset(token)
 
-        message = f"{request.client.host}:{request.client.port} - {request.method} - {request.url.path} - {response.status_code} completed after {processing_time}s"
+            # the router stores the matched route in the scope on its way in
+            route = scope.get("route")
+            template = getattr(route, "path", UNMATCHED_ROUTE)
+            status = str(status_code)
 
-        print(message)
-        return response
+            http_requests.labels(method, template, status).inc()
+            http_request_duration.labels(method, template, status).observe(duration)
+
+            client = scope.get("client") or ("", 0)
+            access_logger.info(
+                "%s %s %s",
+                method,
+                scope["path"],
+                status_code,
+                extra={
+                    "client": f"{client[0]}:{client[1]}",
+                    "method": method,
+                    "path": scope["path"],
+                    "route": template,
+                    "status": status_code,
+                    "duration_ms": round(duration * 1000, 3),
+                    "queries": stats.count,
+                },
+            )
+
+        check_budget(stats, method, template)
+
+
+def register_middleware(app: FastAPI):
+
+    app.add_middleware(CompressionMiddleware, minimum_size=Config.COMPRESSION_MINIMUM_SIZE)
+
+    app.add_middleware(RequestMetricsMiddleware)
 
     app.add_middleware(
         CORSMiddleware,
@@ -35,4 +115,9 @@ def register_middleware(app: FastAPI):
     app.add_middleware(
         TrustedHostMiddleware,
         allowed_hosts=["localhost", "127.0.0.1" ,"bookworm-yz8p.onrender.com","0.0.0.0"],
-    )
\ No newline at end of file
+    )
+
+    if Config.TRUSTED_PROXIES:
+        # outermost, so the rate limits and the access log see the client
+        # named by the proxy rather than the proxy itself
+        app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=Config.TRUSTED_PROXIES)
@@ -0,0 +1,151 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Generic, List, Optional, Sequence, TypeVar
+import uuid
+
+from fastapi import Query
+from pydantic import BaseModel
+from sqlalchemy import asc, desc, tuple_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.errors import InvalidCursor
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    limit: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+class PageParams:
+    """Query parameters shared by every list route"""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(default=None, description="Opaque cursor from a previous page"),
+        limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    ) -> None:
+        self.cursor = cursor
+        self.limit = limit
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _from_json(value: Any, python_type: type) -> Any:
+    if value is None:
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is uuid.UUID:
+        return uuid.UUID(value)
+    return python_type(value)
+
+
+def encode_cursor(values: Sequence[Any], direction: str, tag: str = "") -> str:
+    payload = {"k": [_to_json(v) for v in values], "d": direction, "t": tag}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[Any], tag: str = "") -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = payload["k"]
+        direction = payload["d"]
+
+        if direction not in ("next", "prev") or len(values) != len(keys):
+            raise ValueError("malformed cursor")
+        if payload.get("t", "") != tag:
+            raise ValueError("cursor was issued for a different sort order")
+
+        decoded = [_from_json(v, key.type.python_type) for v, key in zip(values, keys)]
+
+    except Exception as e:
+        raise InvalidCursor() from e
+
+    return decoded, direction
+
+
+async def paginate(
+    session: AsyncSession,
+    entity: Any,
+    params: PageParams,
+    keys: Sequence[Any],
+    where: Sequence[Any] = (),
+    options: Sequence[Any] = (),
+    descending: bool = True,
+    tag: str = "",
+    columns: Sequence[Any] = (),
+) -> Page:
+    """Select one keyset page of `entity` rows matching `where`, ordered on `keys`.
+
+    `keys` must end with a unique column (normally the primary key) so that
+    the sort order is total and every row is reachable from exactly one cursor.
+    `tag` identifies the sort order so a cursor cannot be replayed against
+    another one. `options` are loader options applied to the entity.
+    With `columns` the items are plain tuples of those columns instead of
+    `entity` instances, for callers that serialize rows themselves.
+    """
+
+    direction = "next"
+    selected = list(columns) or [entity]
+    statement = select(*selected, *[key.label(f"_page_key_{i}") for i, key in enumerate(keys)])
+    statement = statement.where(*where).options(*options)
+
+    if params.cursor:
+        values, direction = decode_cursor(params.cursor, keys, tag)
+        key_columns, bound = tuple_(*keys), tuple_(*values)
+        forward = direction == "next"
+
+        if forward == descending:
+            statement = statement.where(key_columns < bound)
+        else:
+            statement = statement.where(key_columns > bound)
+
+    # walking backwards means reading in the opposite order, then flipping
+    reverse = direction == "prev"
+    order = desc if descending != reverse else asc
+    statement = statement.order_by(*[order(key) for key in keys]).limit(params.limit + 1)
+
+    result = await session.exec(statement)
+    rows = result.all()
+
+    has_more = len(rows) > params.limit
+    rows = rows[: params.limit]
+    if reverse:
+        rows.reverse()
+
+    width = len(selected)
+    items = [tuple(row[:width]) if columns else row[0] for row in rows]
+    first_key = tuple(rows[0][width:]) if rows else None
+    last_key = tuple(rows[-1][width:]) if rows else None
+
+    if reverse:
+        has_next, has_prev = bool(params.cursor), has_more
+    else:
+        has_next, has_prev = has_more, bool(params.cursor)
+
+    return Page(
+        items=items,
+        limit=params.limit,
+        next_cursor=encode_cursor(last_key, "next", tag) if has_next and rows else None,
+        prev_cursor=encode_cursor(first_key, "prev", tag) if has_prev and rows else None,
+    )
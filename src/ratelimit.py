@@ -0,0 +1,117 @@
+import logging
+import math
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import Depends, Request
+from redis.exceptions import RedisError
+
+from src.auth.dependencies import get_current_user
+from src.auth.schemas import UserPrincipal
+from src.config import Config
+from src.db.redis import redis_client
+from src.errors import TooManyRequests
+from src.metrics import rate_limited_requests
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+# Token buckets, one hash of tokens and last refill time per key, all
+# checked and charged in one step: a request takes a token from every
+# bucket or, if any of them is empty, from none. Returns the seconds until
+# the emptiest bucket has a token again and its position in KEYS, or
+# {"0", 0} when the request may go ahead.
+TAKE = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local wait, limiting = 0, 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'stamp')
+    local available = tonumber(bucket[1]) or burst
+    local stamp = tonumber(bucket[2]) or now
+    tokens[i] = math.min(burst, available + math.max(0, now - stamp) * rate)
+    if tokens[i] < 1 and (1 - tokens[i]) / rate > wait then
+        wait, limiting = (1 - tokens[i]) / rate, i
+    end
+end
+if limiting > 0 then
+    return {tostring(wait), limiting}
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', tostring(tokens[i] - 1), 'stamp', ARGV[1])
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000))
+end
+return {"0", 0}
+"""
+
+
+def parse_limit(limit: str) -> Tuple[float, int]:
+    """A limit like "10/minute" as a refill rate per second and a burst of 10"""
+    count, _, period = limit.partition("/")
+    return int(count) / PERIODS[period.strip()], int(count)
+
+
+class RateLimiter:
+    """Limits from Config.RATE_LIMITS, enforced with token buckets in Redis.
+
+    A route's limits may apply per client IP ("ip"), per signed-in user
+    ("user") and to all its callers together ("route"); the last one keeps
+    a crowd of clients from using up the bcrypt workers or the DB pool.
+    When Redis cannot answer, requests go through unthrottled, as they do
+    past a missing cache.
+    """
+
+    def __init__(self) -> None:
+        self._take = redis_client.register_script(TAKE)
+
+    async def check(self, route: str, ip: str, user: Optional[str] = None) -> None:
+        limits = Config.RATE_LIMITS.get(route) if Config.RATE_LIMIT_ENABLED else None
+        if not limits:
+            return
+
+        subjects = {"ip": f"ip:{ip}", "user": user and f"user:{user}", "route": "route"}
+        scopes: List[str] = [scope for scope in limits if subjects.get(scope)]
+        keys = [f"ratelimit:{route}:{subjects[scope]}" for scope in scopes]
+        args: List = [time.time()]
+        for scope in scopes:
+            args.extend(parse_limit(limits[scope]))
+
+        try:
+            wait, limiting = await self._take(keys=keys, args=args)
+        except RedisError as e:
+            logging.warning("rate limit check failed for %s: %s", route, e)
+            return
+
+        if limiting:
+            rate_limited_requests.labels(route, scopes[limiting - 1]).inc()
+            raise TooManyRequests(retry_after=max(1, math.ceil(float(wait))))
+
+
+rate_limiter = RateLimiter()
+
+
+def _route(request: Request) -> str:
+    # dependencies run after routing, so the template is known
+    return request.scope["route"].path
+
+
+def _client(request: Request) -> str:
+    # behind a proxy this is only the client's own address when the proxy
+    # is listed in TRUSTED_PROXIES; otherwise every client shares its bucket
+    return request.client.host if request.client else "unknown"
+
+
+async def rate_limit(request: Request) -> None:
+    """Throttle a route by client IP and overall"""
+    await rate_limiter.check(_route(request), _client(request))
+
+
+async def user_rate_limit(
+    request: Request, current_user: UserPrincipal = Depends(get_current_user)
+) -> None:
+    """Throttle a signed-in route by user as well"""
+    await rate_limiter.check(_route(request), _client(request), str(current_user.uid))
+
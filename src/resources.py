@@ -0,0 +1,121 @@
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+import time
+from typing import Awaitable, Dict
+import uuid
+
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.auth.utils import shutdown_hash_executor, warm_hash_executor
+from src.books.routers import book_service, list_columns
+from src.config import Config
+from src.db.loading import BOOK_DETAIL
+from src.db.main import async_engine, replica_engines
+from src.db.redis import blocklist_mirror, redis_client
+from src.pagination import DEFAULT_PAGE_SIZE, PageParams
+from src.tags.routers import TAG_LIST_COLUMNS, tag_service
+
+
+class Readiness:
+    """Whether this worker should be sent traffic, and how its warm-up went.
+
+    Ready once the lifespan has warmed up, and no longer once it starts
+    shutting down. `warmup` holds each step's duration in milliseconds, or
+    its error when it failed or timed out.
+    """
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.warmup: Dict[str, object] = {}
+
+
+readiness = Readiness()
+
+
+async def _hot_statements(session: AsyncSession) -> None:
+    # the same calls the busiest routes make, so SQLAlchemy caches their
+    # compiled SQL and asyncpg prepares it on this connection; statements
+    # are keyed by their text, which the page size does not change
+    params = PageParams(cursor=None, limit=DEFAULT_PAGE_SIZE)
+    page = await book_service.get_all_books(session, params, columns=list_columns())
+    # a real book, so the detail's relationship loads run too
+    book_uid = page.items[0].uid if page.items else uuid.UUID(int=0)
+    await book_service.get_book(book_uid, session, load=BOOK_DETAIL)
+    await tag_service.get_tags(session, params, columns=TAG_LIST_COLUMNS if Config.FAST_JSON_RESPONSES else ())
+
+
+async def warm_engine(engine: AsyncEngine) -> None:
+    """Open the whole pool at once and prepare the hot statements on every
+    connection, instead of leaving the first requests to do both"""
+
+    async def warm_connection() -> None:
+        async with engine.connect() as conn:
+            async with AsyncSession(bind=conn) as session:
+                await _hot_statements(session)
+
+    # held concurrently, so each one is a separate connection
+    await asyncio.gather(*[warm_connection() for _ in range(Config.DB_POOL_SIZE)])
+
+
+async def warm_redis() -> None:
+    await redis_client.ping()
+    # listening from now on lets the first requests skip the blocklist lookup
+    blocklist_mirror.start()
+
+
+async def _timed(name: str, step: Awaitable) -> None:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(step, Config.WARMUP_TIMEOUT)
+    except Exception as e:
+        # a cold start is slower, not broken; requests open what is missing
+        logging.warning("warm-up step %s failed: %r", name, e)
+        readiness.warmup[name] = repr(e)
+    else:
+        readiness.warmup[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+async def warm_up() -> None:
+    """Run every warm-up step in parallel; none of them can fail startup"""
+    steps = {
+        "db:primary": warm_engine(async_engine),
+        **{f"db:{engine.pool.label}": warm_engine(engine) for engine in replica_engines},
+        "redis": warm_redis(),
+        "hash_workers": warm_hash_executor(),
+    }
+    start = time.perf_counter()
+    await asyncio.gather(*[_timed(name, step) for name, step in steps.items()])
+    logging.info("warm-up finished in %.0fms: %s", (time.perf_counter() - start) * 1000, readiness.warmup)
+
+
+async def close() -> None:
+    """Release what this worker holds, so the database and Redis see
+    connections closed rather than dropped"""
+    await blocklist_mirror.stop()
+    shutdown_hash_executor()
+
+    results = await asyncio.gather(
+        async_engine.dispose(),
+        *[engine.dispose() for engine in replica_engines],
+        redis_client.aclose(),
+        return_exceptions=True,
+    )
+    for error in results:
+        if isinstance(error, Exception):
+            logging.warning("error while closing resources: %r", error)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if Config.WARMUP_ENABLED:
+        await warm_up()
+    readiness.ready = True
+
+    try:
+        yield
+    finally:
+        readiness.ready = False
+        await close()
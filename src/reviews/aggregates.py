@@ -0,0 +1,102 @@
+from typing import Optional
+import uuid
+
+from sqlalchemy import Float, Update, case, cast, func, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.db.models import Books
+
+books_table = Books.__table__
+
+
+def rating_update(book_uid: uuid.UUID, rating: int, step: int) -> Update:
+    """Add (`step=1`) or remove (`step=-1`) one `rating` from a book's counters.
+
+    The new values are computed from the row being updated, so concurrent
+    reviews of the same book queue on its row lock instead of losing counts.
+    Returns the updated review_count and rating_sum.
+    """
+    key = str(rating)
+    count = books_table.c.review_count + step
+    total = books_table.c.rating_sum + step * rating
+    star = func.coalesce(books_table.c.rating_histogram[key].astext.cast(books_table.c.review_count.type), 0)
+
+    return (
+        update(books_table)
+        .where(books_table.c.uid == book_uid)
+        .values(
+            review_count=count,
+            rating_sum=total,
+            average_rating=case((count > 0, cast(total, Float) / cast(count, Float)), else_=0.0),
+            # a star that drops to zero is removed, as the reconciliation builds it
+            rating_histogram=case(
+                (
+                    star + step > 0,
+                    books_table.c.rating_histogram.op("||")(func.jsonb_build_object(key, star + step)),
+                ),
+                else_=books_table.c.rating_histogram.op("-")(key),
+            ),
+        )
+        .returning(books_table.c.review_count, books_table.c.rating_sum)
+    )
+
+
+# recomputes the counters of one batch of books from their reviews and
+# only writes the books whose counters drifted
+RECONCILE_BATCH = text("""
+    WITH batch AS (
+        SELECT uid FROM books
+        WHERE CAST(:after AS uuid) IS NULL OR uid > CAST(:after AS uuid)
+        ORDER BY uid LIMIT :batch_size
+    ),
+    stars AS (
+        SELECT reviews.book_uid, reviews.rating, count(*) AS n
+        FROM reviews JOIN batch ON reviews.book_uid = batch.uid
+        GROUP BY reviews.book_uid, reviews.rating
+    ),
+    actual AS (
+        SELECT batch.uid,
+               coalesce(sum(stars.n), 0)::int AS review_count,
+               coalesce(sum(stars.rating * stars.n), 0)::int AS rating_sum,
+               coalesce(jsonb_object_agg(stars.rating::text, stars.n)
+                        FILTER (WHERE stars.rating IS NOT NULL), '{}') AS rating_histogram
+        FROM batch LEFT JOIN stars ON stars.book_uid = batch.uid
+        GROUP BY batch.uid
+    ),
+    fixed AS (
+        UPDATE books SET
+            review_count = actual.review_count,
+            rating_sum = actual.rating_sum,
+            average_rating = CASE WHEN actual.review_count > 0
+                THEN actual.rating_sum::float8 / actual.review_count ELSE 0 END,
+            rating_histogram = actual.rating_histogram
+        FROM actual
+        WHERE books.uid = actual.uid
+          AND (books.review_count, books.rating_sum, books.rating_histogram)
+              IS DISTINCT FROM (actual.review_count, actual.rating_sum, actual.rating_histogram)
+        RETURNING books.uid
+    )
+    SELECT (SELECT max(uid::text) FROM batch) AS last_uid, (SELECT count(*) FROM fixed) AS fixed
+""")
+
+
+async def reconcile_ratings(conn: AsyncConnection, batch_size: int = 5000) -> int:
+    """Bring every book's rating counters in line with its reviews.
+
+    Walks the books in uid order, one committed batch at a time, so it can
+    run next to live traffic. Returns how many books had drifted.
+    """
+    after: Optional[str] = None
+    fixed = 0
+
+    while True:
+        row = (
+            await conn.execute(RECONCILE_BATCH, {"after": after, "batch_size": batch_size})
+        ).one()
+        await conn.commit()
+
+        if row.last_uid is None:
+            return fixed
+
+        after = row.last_uid
+        fixed += row.fixed
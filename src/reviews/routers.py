@@ -2,9 +2,11 @@ from fastapi import APIRouter, Depends, status
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.auth.dependencies import get_current_user, RoleChecker
-from src.db.main import get_session
-from src.db.models import User
-from .schemas import ReviewCreateModel
+from src.db.main import get_read_session, get_session
+from src.auth.schemas import UserPrincipal
+from src.pagination import Page, PageParams
+from src.ratelimit import user_rate_limit
+from .schemas import ReviewCreateModel, ReviewModel
 from .service import ReviewService
 
 review_router = APIRouter()
@@ -13,25 +15,27 @@ admin_role_checker = Depends(RoleChecker(["admin"]))
 user_role_checker = Depends(RoleChecker(["user", "admin"]))
 
 
-@review_router.get("/", dependencies=[admin_role_checker])
-async def get_all_reviews(session: AsyncSession = Depends(get_session)):
-    books = await review_service.get_all_reviews(session)
+@review_router.get("/", response_model=Page[ReviewModel], dependencies=[admin_role_checker])
+async def get_all_reviews(
+    page: PageParams = Depends(), session: AsyncSession = Depends(get_read_session)
+):
+    books = await review_service.get_all_reviews(session, page)
 
     return books
 
 
 @review_router.get("/{review_uid}", dependencies=[user_role_checker])
-async def get_review(review_uid: str, session: AsyncSession = Depends(get_session)):
+async def get_review(review_uid: str, session: AsyncSession = Depends(get_read_session)):
     book = await review_service.get_review(review_uid, session)
 
     if not book:
         raise
 
-@review_router.post("/book/{book_uid}")
+@review_router.post("/book/{book_uid}", dependencies=[Depends(user_rate_limit)])
 async def add_review_to_books(
     book_uid: str,
     review_data: ReviewCreateModel,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_user),
     session: AsyncSession = Depends(get_session)
 ):
     new_review = await review_service.add_review_to_book(
@@ -50,7 +54,7 @@ async def add_review_to_books(
 )
 async def delete_review(
     review_uid: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ):
     await review_service.delete_review_to_from_book(
@@ -3,9 +3,14 @@ from fastapi import status
 from fastapi.exceptions import HTTPException
 from src.db.models import Review
 from src.auth.service import UserService
+from src.books.leaderboards import leaderboards
 from src.books.service import BookService
-from sqlmodel import desc, select
+from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
+from src.cache import book_detail_cache
+from src.pagination import Page, PageParams, paginate
+from src.watermarks import BOOKS, book_key, watermarks
+from .aggregates import rating_update
 from .schemas import ReviewCreateModel
 
 book_service = BookService()
@@ -21,7 +26,7 @@ class ReviewService:
                 book_uid=book_uid,
                 session=session,
             )
-            user = await user_service.get_user_by_email(
+            user = await user_service.get_principal(
                 email=user_email,
                 session=session,
             )
@@ -39,11 +44,21 @@ class ReviewService:
                 **review_data.model_dump()
             )
 
-            new_review.user = user
-            new_review.books = book
+            # set the keys rather than the relationships so the unloaded
+            # user.reviews / book.reviews collections are left alone
+            new_review.user_uid = user.uid
+            new_review.book_uid = book.uid
 
             session.add(new_review)
+            counters = (
+                await session.exec(rating_update(book.uid, new_review.rating, 1))
+            ).one()
             await session.commit()
+            await book_detail_cache.invalidate(str(book.uid))
+            await watermarks.bump(BOOKS, book_key(book.uid))
+            await leaderboards.record_review(
+                book, new_review.created_at, counters.review_count, counters.rating_sum
+            )
             return new_review
 
 
@@ -61,26 +76,38 @@ class ReviewService:
 
         return result.first()
 
-    async def get_all_reviews(self, session: AsyncSession):
-        statement = select(Review).order_by(desc(Review.created_at))
-
-        result = await session.exec(statement)
-
-        return result.all()
+    async def get_all_reviews(self, session: AsyncSession, params: PageParams) -> Page:
+        return await paginate(
+            session, Review, params, keys=(Review.created_at, Review.uid)
+        )
 
     async def delete_review_to_from_book(
         self, review_uid: str, user_email: str, session: AsyncSession
     ):
-        user = await user_service.get_user_by_email(user_email, session)
+        user = await user_service.get_principal(user_email, session)
 
         review = await self.get_review(review_uid, session)
 
-        if not review or (review.user != user):
+        if not review or not user or (review.user_uid != user.uid):
             raise HTTPException(
                 detail="Cannot delete this review",
                 status_code=status.HTTP_403_FORBIDDEN,
             )
 
-        session.delete(review)
+        await session.delete(review)
 
-        await session.commit()
\ No newline at end of file
+        # a review outlives its book, detached, and then counts for no book
+        if review.book_uid is None:
+            await session.commit()
+            return
+
+        counters = (
+            await session.exec(rating_update(review.book_uid, review.rating, -1))
+        ).one()
+
+        await session.commit()
+        await book_detail_cache.invalidate(str(review.book_uid))
+        await watermarks.bump(BOOKS, book_key(review.book_uid))
+        await leaderboards.record_review_removed(
+            review.book_uid, review.created_at, counters.review_count, counters.rating_sum
+        )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import List
+import uuid
 
 from fastapi import APIRouter, Depends, status
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -6,19 +6,34 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.auth.dependencies import RoleChecker
 from src.books.schemas import Books
-from src.db.main import get_session
-
-from .schemas import TagAddModel, TagCreateModel, TagModel
+from src.config import Config
+from src.db.main import get_read_session, get_session, reads_primary
+from src.db.models import Tag
+from src.fastjson import model_columns, page_response
+from src.pagination import Page, PageParams
+from src.watermarks import TAGS, conditional
+
+from .schemas import TagAddModel, TagAssignModel, TagAssignResult, TagCreateModel, TagModel
 from .service import TagService
 
 tags_router = APIRouter()
 tag_service = TagService()
 user_role_checker = Depends(RoleChecker(["user", "admin"]))
+TAG_LIST_COLUMNS = model_columns(TagModel, Tag)
+
 
+@tags_router.get("/", response_model=Page[TagModel], dependencies=[user_role_checker])
+async def get_all_tags(
+    page: PageParams = Depends(),
+    session: AsyncSession = Depends(get_read_session),
+    validators: dict = Depends(conditional(TAGS)),
+):
+    if Config.FAST_JSON_RESPONSES:
+        tags = await tag_service.get_tags(session, page, columns=TAG_LIST_COLUMNS)
+        # a replica may be behind the validator, which was read first
+        return page_response(tags, TagModel, validators if reads_primary(session) else None)
 
-@tags_router.get("/", response_model=List[TagModel], dependencies=[user_role_checker])
-async def get_all_tags(session: AsyncSession = Depends(get_session)):
-    tags = await tag_service.get_tags(session)
+    tags = await tag_service.get_tags(session, page)
 
     return tags
 
@@ -42,7 +57,7 @@ async def add_tag(
     "/book/{book_uid}/tags", response_model=Books, dependencies=[user_role_checker]
 )
 async def add_tags_to_book(
-    book_uid: str, tag_data: TagAddModel, session: AsyncSession = Depends(get_session)
+    book_uid: uuid.UUID, tag_data: TagAddModel, session: AsyncSession = Depends(get_session)
 ) -> Books:
 
     book_with_tag = await tag_service.add_tags_to_book(
@@ -52,6 +67,18 @@ async def add_tags_to_book(
     return book_with_tag
 
 
+@tags_router.post(
+    "/assign", response_model=TagAssignResult, dependencies=[user_role_checker]
+)
+async def assign_tags(
+    assignment: TagAssignModel, session: AsyncSession = Depends(get_session)
+) -> TagAssignResult:
+
+    return await tag_service.assign_tags(
+        assignment.book_uids, [tag.name for tag in assignment.tags], session
+    )
+
+
 @tags_router.put(
     "/{tag_uid}", response_model=TagModel, dependencies=[user_role_checker]
 )
@@ -1,10 +1,21 @@
+from datetime import datetime
+from typing import Sequence
+import uuid
+
 from fastapi import status
 from fastapi.exceptions import HTTPException
-from sqlmodel import desc, select
+from sqlalchemy import Boolean, literal_column, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from src.books.search import refresh_search_vectors
 from src.books.service import BookService
-from src.db.models import Tag
+from src.cache import book_detail_cache
+from src.db.loading import load_options
+from src.db.models import Books, BookTag, Tag
+from src.pagination import Page, PageParams, paginate
+from src.watermarks import TAGS, book_key, watermarks
 
 from .schemas import TagAddModel, TagCreateModel
 from src.errors import (
@@ -18,42 +29,122 @@ server_error = HTTPException(
 
 class TagService:
 
-    async def get_tags(self, session: AsyncSession):
-        """Get all tags"""
-
-        statement = select(Tag).order_by(desc(Tag.created_at))
-
-        result = await session.exec(statement)
+    async def get_tags(self, session: AsyncSession, params: PageParams, columns: Sequence = ()) -> Page:
+        """Get a page of tags"""
+
+        return await paginate(session, Tag, params, keys=(Tag.created_at, Tag.uid), columns=columns)
+
+    async def assign_tags(
+        self,
+        book_uids: Sequence[uuid.UUID],
+        tag_names: Sequence[str],
+        session: AsyncSession,
+    ) -> dict:
+        """Link every book in `book_uids` to every tag in `tag_names`.
+
+        The books are locked first; if none of them exists, nothing is
+        written. Unknown tags are then created and all tags resolved by one
+        upsert, and the links are written by one INSERT ... SELECT. Every
+        step locks rows in sorted order, so concurrent assignments wait on
+        each other instead of deadlocking, and links that already exist are
+        left alone.
+        """
+        book_uids = list(dict.fromkeys(book_uids))
+        tag_names = sorted(set(tag_names))
+        now = datetime.now()
+
+        # KEY SHARE keeps the books from being deleted before they are linked
+        found = (
+            await session.exec(
+                select(Books.uid)
+                .where(Books.uid.in_(book_uids))
+                .order_by(Books.uid)
+                .with_for_update(key_share=True)
+            )
+        ).all()
+
+        # nothing is created for books that are not there
+        if not found:
+            await session.rollback()
+            return {"books": [], "missing_books": book_uids, "created_tags": []}
+
+        tags = []
+        # an empty VALUES list would insert one row of column defaults
+        if tag_names:
+            upsert = pg_insert(Tag.__table__).values(
+                [{"uid": uuid.uuid4(), "name": name, "created_at": now} for name in tag_names]
+            )
+            # DO UPDATE rather than DO NOTHING so existing tags come back too;
+            # xmax is only zero on rows this statement inserted
+            upsert = upsert.on_conflict_do_update(
+                index_elements=["name"], set_={"name": upsert.excluded.name}
+            ).returning(
+                Tag.__table__.c.uid,
+                Tag.__table__.c.name,
+                literal_column("xmax = 0", Boolean).label("created"),
+            )
+            tags = (await session.exec(upsert)).all()
+        tag_names_by_uid = {tag.uid: tag.name for tag in tags}
+
+        added = {book_uid: [] for book_uid in found}
+        if tags:
+            links = (
+                pg_insert(BookTag.__table__)
+                .from_select(
+                    ["book_id", "tag_id"],
+                    select(Books.uid, Tag.uid)
+                    .join(Tag, true())
+                    .where(Books.uid.in_(found), Tag.uid.in_(list(tag_names_by_uid)))
+                    .order_by(Books.uid, Tag.uid),
+                )
+                .on_conflict_do_nothing()
+                .returning(BookTag.__table__.c.book_id, BookTag.__table__.c.tag_id)
+            )
+            for link in (await session.exec(links)).all():
+                added[link.book_id].append(tag_names_by_uid[link.tag_id])
+
+            await refresh_search_vectors(session, found)
 
-        return result.all()
+        await session.commit()
+        await book_detail_cache.invalidate(*[str(book_uid) for book_uid in found])
+        created = [TAGS] if any(tag.created for tag in tags) else []
+        await watermarks.bump(*created, *[book_key(book_uid) for book_uid in found])
+
+        return {
+            "books": [
+                {
+                    "book_uid": book_uid,
+                    "added": sorted(names),
+                    "already_tagged": [name for name in tag_names if name not in names],
+                }
+                for book_uid, names in added.items()
+            ],
+            "missing_books": [book_uid for book_uid in book_uids if book_uid not in added],
+            "created_tags": [tag.name for tag in tags if tag.created],
+        }
 
     async def add_tags_to_book(
-        self, book_uid: str, tag_data: TagAddModel, session: AsyncSession
+        self, book_uid: uuid.UUID, tag_data: TagAddModel, session: AsyncSession
     ):
         """Add tags to a book"""
 
-        book = await book_service.get_book(book_uid=book_uid, session=session)
+        result = await self.assign_tags(
+            [book_uid], [tag.name for tag in tag_data.tags], session
+        )
 
-        if not book:
+        if result["missing_books"]:
             raise BookNotFound()
 
-        for tag_item in tag_data.tags:
-            result = await session.exec(select(Tag).where(Tag.name == tag_item.name))
-
-            tag = result.one_or_none()
-            if not tag:
-                tag = Tag(name=tag_item.name)
+        return await book_service.get_book(book_uid, session)
 
-            book.tags.append(tag)
-        session.add(book)
-        await session.commit()
-        await session.refresh(book)
-        return book
-
-    async def get_tag_by_uid(self, tag_uid: str, session: AsyncSession):
+    async def get_tag_by_uid(
+        self, tag_uid: str, session: AsyncSession, load: Sequence[str] = ()
+    ):
         """Get tag by uid"""
 
-        statement = select(Tag).where(Tag.uid == tag_uid)
+        statement = (
+            select(Tag).where(Tag.uid == tag_uid).options(*load_options(Tag, load))
+        )
 
         result = await session.exec(statement)
 
@@ -75,6 +166,7 @@ class TagService:
         session.add(new_tag)
 
         await session.commit()
+        await watermarks.bump(TAGS)
 
         return new_tag
 
@@ -93,7 +185,12 @@ class TagService:
         for k, v in update_data_dict.items():
             setattr(tag, k, v)
 
+            await session.flush()
+            await refresh_search_vectors(
+                session, select(BookTag.book_id).where(BookTag.tag_id == tag.uid)
+            )
             await session.commit()
+            await watermarks.bump(TAGS)
 
             await session.refresh(tag)
 
@@ -102,11 +199,18 @@ class TagService:
     async def delete_tag(self, tag_uid: str, session: AsyncSession):
         """Delete a tag"""
 
-        tag = self.get_tag_by_uid(tag_uid,session)
+        # booktag links are removed through tag.books, so it must be loaded
+        tag = await self.get_tag_by_uid(tag_uid, session, load=("books",))
 
         if not tag:
             raise TagNotFound()
 
+        # the links are gone once the tag is flushed, so collect the books first
+        book_uids = [book.uid for book in tag.books]
+
         await session.delete(tag)
+        await session.flush()
+        await refresh_search_vectors(session, book_uids)
 
-        await session.commit()
\ No newline at end of file
+        await session.commit()
+        await watermarks.bump(TAGS)
\ No newline at end of file
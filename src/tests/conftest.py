@@ -4,11 +4,21 @@ from unittest.mock import Mock
 
 from fastapi.testclient import TestClient
 import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src import app
-from src.db.main import get_session
+from src.config import Config
+from src.db.accounting import track_queries
+from src.db.main import get_read_session, get_session
+from src.db.redis import redis_client
 from src.db.models import Books
-from src.auth.dependencies import AccessTokenBearer, RoleChecker, RefreshTokenBearer
+from src.auth.dependencies import AccessTokenBearer, RoleChecker, RefreshTokenBearer, get_current_user
+from src.books.routers import access_token_bearer as book_access_token_bearer
 
 
 mock_session = Mock()
@@ -24,9 +34,17 @@ def get_mock_session():
 
 
 app.dependency_overrides[get_session] = get_mock_session
+app.dependency_overrides[get_read_session] = get_mock_session
 app.dependency_overrides[role_checker] = Mock()
 app.dependency_overrides[refresh_bearer] = Mock()
 
+# a route going over its query budget fails the test instead of warning
+Config.DB_QUERY_BUDGET_STRICT = True
+# the buckets would outlive the test run in a real Redis
+Config.RATE_LIMIT_ENABLED = False
+# tests bring their own databases, so there is no pool to warm
+Config.WARMUP_ENABLED = False
+
 @pytest.fixture
 def fake_session():
     return mock_session
@@ -37,9 +55,17 @@ def fake_user_service():
     return mock_user_service
 
 
+def serve(client: TestClient):
+    """Run every request of a test on one event loop, and drop the Redis
+    connections opened on it before the next test brings its own loop"""
+    with client:
+        yield client
+        client.portal.call(redis_client.connection_pool.disconnect)
+
+
 @pytest.fixture
 def test_client():
-    return TestClient(app)
+    yield from serve(TestClient(app))
 
 
 @pytest.fixture
@@ -58,4 +84,69 @@ def test_book():
         language="English",
         published_date=datetime.now(),
         update_at=datetime.now()
-    )
\ No newline at end of file
+    )
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """A throwaway on-disk sqlite database with the app schema.
+
+    Returns a session factory for an async engine; every test drives it
+    with `asyncio.run`, so the pool is disabled to keep connections from
+    outliving the loop that opened them.
+    """
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+
+    sync_engine = create_engine(url)
+    SQLModel.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+
+    engine = create_async_engine(url.replace("sqlite", "sqlite+aiosqlite"), poolclass=NullPool)
+    track_queries(engine)
+
+    yield sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+class QueryCounter:
+    def __init__(self, engine) -> None:
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+    def reset(self) -> None:
+        self.count = 0
+
+
+@pytest.fixture
+def sqlite_client(sqlite_db):
+    """A test client whose routes run against `sqlite_db` as a verified admin.
+
+    Yields the client, the session factory and a counter of the SQL
+    statements sent to the database.
+    """
+    user = {"email": "reader@example.com", "user_uid": None}
+
+    async def get_sqlite_session():
+        async with sqlite_db() as session:
+            yield session
+
+    async def get_verified_user():
+        return Mock(email=user["email"], uid=user["user_uid"], role="admin", is_verified=True)
+
+    overrides = {
+        get_session: get_sqlite_session,
+        get_read_session: get_sqlite_session,
+        get_current_user: get_verified_user,
+        book_access_token_bearer: lambda: {"user": user},
+    }
+    app.dependency_overrides.update(overrides)
+
+    for client in serve(TestClient(app, base_url="http://localhost")):
+        yield client, sqlite_db, user, QueryCounter(sqlite_db.kw["bind"])
+
+    for dependency in overrides:
+        app.dependency_overrides.pop(dependency, None)
+    app.dependency_overrides[get_session] = get_mock_session
+    app.dependency_overrides[get_read_session] = get_mock_session
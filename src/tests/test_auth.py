@@ -1,4 +1,20 @@
-from src.auth.schemas import UserCreateModel
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+import uuid
+
+import pytest
+from redis.exceptions import RedisError
+
+from src.auth import dependencies, service as auth_service
+from src.auth.dependencies import RoleChecker, get_current_user
+from src.auth.schemas import UserCreateModel, UserPrincipal
+from src.auth.service import UserService
+from src.auth.utils import VerifiedTokenCache, create_access_token, decode_token, user_claims
+from src.db.models import User
+from src.db.redis import VERSION_PREFIX, BlocklistMirror, redis_client, token_revoked
+from src.errors import AccountNotVerified, InvalidToken
 
 def test_user_signup(fake_session, fake_user_service, test_client):
     user_data = {
@@ -18,4 +34,128 @@ def test_user_signup(fake_session, fake_user_service, test_client):
     assert fake_user_service.user_exists_called_once()
     assert fake_user_service.user_exists_called_once_with(user_data['email'],fake_session)
     assert fake_user_service.create_user_called_once()
-    assert fake_user_service.create_user_called_once_with(user,fake_session)
\ No newline at end of file
+    assert fake_user_service.create_user_called_once_with(user,fake_session)
+
+def test_verified_token_cache_is_bounded_and_honours_exp():
+    cache = VerifiedTokenCache(max_size=2)
+    tokens = [create_access_token({"email": f"user{i}@example.com"}) for i in range(3)]
+    for token in tokens:
+        cache.put(token, decode_token(token), checked_at=0.0)
+
+    assert cache.get(tokens[0]) is None
+    assert cache.get(tokens[2])[0]["user"]["email"] == "user2@example.com"
+
+    expired = create_access_token({"email": "old@example.com"}, expiry=timedelta(seconds=-1))
+    cache.put(expired, {"exp": 0}, checked_at=0.0)
+    assert cache.get(expired) is None
+
+
+def test_access_tokens_authorize_without_a_lookup():
+    user = UserPrincipal(uid=uuid.uuid4(), email="reader@example.com", role="user", is_verified=True)
+    token_data = decode_token(create_access_token(user_claims(user, token_version=3)))
+
+    assert asyncio.run(get_current_user(token_data)) == user
+    assert token_data["user"]["token_version"] == 3
+    assert "role" not in user_claims(user, 3, refresh=True)
+
+    # issued before access tokens carried the claims
+    legacy = decode_token(create_access_token({"email": user.email, "user_uid": str(user.uid)}))
+    with pytest.raises(InvalidToken):
+        asyncio.run(get_current_user(legacy))
+
+
+def test_blocklist_mirror_tracks_token_versions():
+    mirror = BlocklistMirror()
+    mirror._receive(f"{VERSION_PREFIX}some-uid:2")
+    mirror._receive("a-jti")
+
+    assert "a-jti" in mirror
+    assert mirror.outdated("some-uid", 1)
+    assert not mirror.outdated("some-uid", 2)
+    assert not mirror.outdated("other-uid", 0)
+
+    # a stale message never lowers the version
+    mirror._receive(f"{VERSION_PREFIX}some-uid:1")
+    assert mirror.outdated("some-uid", 1)
+
+
+def test_revocations_survive_losing_the_cached_version(test_client, sqlite_db):
+    user_uid = uuid.uuid4()
+    key = f"token_version:{user_uid}"
+    try:
+        test_client.portal.call(redis_client.delete, key)
+    except RedisError:
+        pytest.skip("needs a Redis at REDIS_URL")
+
+    async def seed():
+        async with sqlite_db() as session:
+            session.add(User(
+                uid=user_uid,
+                username="reader",
+                email=f"{user_uid}@example.com",
+                first_name="Ada",
+                last_name="Reader",
+                password_hash="x",
+            ))
+            await session.commit()
+
+    async def revoke() -> int:
+        async with sqlite_db() as session:
+            return await UserService().revoke_tokens(str(user_uid), session)
+
+    async def revoked(version: int) -> bool:
+        async with sqlite_db() as session:
+            return await token_revoked(
+                "some-jti",
+                str(user_uid),
+                version,
+                lambda: UserService().get_token_version(str(user_uid), session),
+            )
+
+    test_client.portal.call(seed)
+    first = test_client.portal.call(revoke)
+
+    # Redis loses the version, then the user revokes again
+    test_client.portal.call(redis_client.delete, key)
+    second = test_client.portal.call(revoke)
+    assert second == first + 1
+    assert test_client.portal.call(revoked, first)
+
+    # and loses it once more: the check falls back to the stored version
+    test_client.portal.call(redis_client.delete, key)
+    assert test_client.portal.call(revoked, first)
+    assert not test_client.portal.call(revoked, second)
+    assert test_client.portal.call(redis_client.get, key) == str(second).encode()
+    test_client.portal.call(redis_client.delete, key)
+
+
+def test_committed_user_changes_survive_a_redis_outage(monkeypatch):
+    async def unavailable(*args, **kwargs):
+        raise RedisError("connection refused")
+
+    monkeypatch.setattr(auth_service, "publish_token_version", unavailable)
+    monkeypatch.setattr(redis_client, "delete", unavailable)
+    session = AsyncMock()
+    user = SimpleNamespace(uid=uuid.uuid4(), email="reader@example.com", role="user")
+
+    updated = asyncio.run(UserService().update_user(user, {"role": "admin"}, session))
+
+    assert updated.role == "admin"
+    session.commit.assert_awaited_once()
+
+
+@pytest.mark.parametrize("verified_since", [True, False])
+def test_tokens_from_before_verification_are_checked_again(monkeypatch, verified_since):
+    claims = UserPrincipal(uid=uuid.uuid4(), email="reader@example.com", role="user", is_verified=False)
+
+    async def get_principal(email, session):
+        return claims.model_copy(update={"is_verified": verified_since})
+
+    monkeypatch.setattr(dependencies.user_service, "get_principal", get_principal)
+    checker = RoleChecker(["user"])
+
+    if verified_since:
+        assert asyncio.run(checker(claims, session=None)) is True
+    else:
+        with pytest.raises(AccountNotVerified):
+            asyncio.run(checker(claims, session=None))
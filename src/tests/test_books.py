@@ -1,4 +1,15 @@
+import asyncio
+from datetime import datetime
+import json
+from types import SimpleNamespace
+import uuid
+
+import pytest
+
+from src.books.bulk import iter_lines, iter_rows, spool_body, validate_row
+from src.books.export import decode_export_cursor, export_record, to_csv, to_ndjson
 from src.books.schemas import BookCreateModel
+from src.errors import ImportTooLarge
 books_prefix = f"/api/v1/books"
 def test_get_books(test_client, fake_book_service, fake_session):
     response = test_client.get(
@@ -39,4 +50,67 @@ def test_update_book_by_uid(test_client, fake_book_service,test_book, fake_sessi
     response = test_client.put(f"{books_prefix}/{test_book.uid}")
 
     assert fake_book_service.get_book_called_once()
-    assert fake_book_service.get_book_called_once_with(test_book.uid,fake_session)
\ No newline at end of file
+    assert fake_book_service.get_book_called_once_with(test_book.uid,fake_session)
+
+def test_import_spool_stops_at_the_size_limit():
+    async def chunks():
+        for _ in range(4):
+            yield b"x" * 10
+
+    spool = asyncio.run(spool_body(chunks(), max_size=5, limit=40))
+    assert spool.read() == b"x" * 40
+    spool.close()
+
+    with pytest.raises(ImportTooLarge):
+        asyncio.run(spool_body(chunks(), max_size=5, limit=39))
+
+
+def test_import_rows_report_line_errors():
+    body = (
+        b"title,author,publisher,published_date,page_count,language\n"
+        b"Test Title,Test Author,Test Publications,2024-12-10,215,English\n"
+        b"Test Title,Test Author\n"
+        b"Test Title,Test Author,Test Publications,2024-13-10,215,English\n"
+    )
+
+    async def chunks():
+        # split mid-line to exercise the line reassembly
+        yield body[:70]
+        yield body[70:]
+
+    async def collect():
+        return [row async for row in iter_rows(iter_lines(chunks()), "csv")]
+
+    rows = asyncio.run(collect())
+    owner = uuid.uuid4()
+
+    assert [line_no for line_no, _, _ in rows] == [2, 3, 4]
+    assert rows[1][2] == "expected 6 fields, got 2"
+
+    record, errors = validate_row(rows[0][1], owner)
+    assert errors is None and record[1] == "Test Title" and record[7] == owner
+
+    record, errors = validate_row(rows[2][1], owner)
+    assert record is None and errors[0]["loc"] == ["published_date"]
+
+
+def test_export_record_resumes_after_itself():
+    created_at, uid = datetime(2024, 12, 10, 8, 30), uuid.uuid4()
+    values = {
+        "uid": uid, "title": "Test Title", "author": "Test Author",
+        "publisher": "Test Publications", "published_date": created_at.date(),
+        "page_count": 215, "language": "English", "user_uid": None,
+        "created_at": created_at, "updated_at": created_at,
+        "review_count": 3, "average_rating": 2.3333, "tags": ["b", "a"],
+    }
+    row = SimpleNamespace(_mapping=values, created_at=created_at, uid=uid)
+
+    record = export_record(row)
+
+    assert json.loads(to_ndjson([record]))["tags"] == ["a", "b"]
+    assert record["average_rating"] == 2.33
+    assert decode_export_cursor(record["cursor"]) == (created_at, uid)
+
+    header, line = to_csv([record], header=True).splitlines()
+    assert header.endswith("review_count,average_rating,tags,cursor")
+    assert ",3,2.33,a|b," in line
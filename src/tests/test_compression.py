@@ -0,0 +1,89 @@
+import asyncio
+from datetime import date
+import json
+import uuid
+
+import pytest
+
+from src import compression
+from src.db.models import Books
+
+
+def seed(session_factory, user_uid, count):
+    async def _seed():
+        async with session_factory() as session:
+            session.add_all([
+                Books(
+                    title=f"Title {i}",
+                    author="author",
+                    publisher="publisher",
+                    published_date=date(2000, 1, 1),
+                    page_count=100 + i,
+                    language="English",
+                    user_uid=user_uid,
+                )
+                for i in range(count)
+            ])
+            await session.commit()
+
+    asyncio.run(_seed())
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, deflate, br, zstd", compression.ENCODINGS[0]),
+        ("br;q=0.5, gzip;q=0.8", "gzip"),
+        ("*;q=0, gzip;q=0", None),
+        ("*", compression.ENCODINGS[0]),
+        ("GZIP;q=0.1, unknown", "gzip"),
+    ],
+)
+def test_negotiate(accept_encoding, expected):
+    assert compression.negotiate(accept_encoding) == expected
+
+
+@pytest.mark.parametrize("encoding", compression.ENCODINGS)
+def test_large_responses_are_compressed(sqlite_client, encoding):
+    client, session_factory, _, _ = sqlite_client
+    user_uid = uuid.uuid4()
+    seed(session_factory, user_uid, 20)
+
+    response = client.get(f"/api/v1/books/user/{user_uid}", headers={"Accept-Encoding": encoding})
+    identity = client.get(f"/api/v1/books/user/{user_uid}", headers={"Accept-Encoding": "identity"})
+
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(identity.content)
+    assert "content-encoding" not in identity.headers
+    assert response.json() == identity.json()
+
+
+def test_small_responses_are_sent_as_is(sqlite_client):
+    client, _, _, _ = sqlite_client
+
+    response = client.get("/api/v1/tags/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.parametrize("encoding", compression.ENCODINGS)
+def test_packed_entries_are_sent_as_stored_or_decompressed(encoding):
+    body = json.dumps({"title": "x" * 2000}).encode()
+    stored = compression.pack(body, encoding, minimum_size=1024)
+
+    assert compression.unpack(stored)[0] == encoding
+    assert compression.decompress(compression.unpack(stored)[1], encoding) == body
+    assert compression.pack(b"{}", encoding, minimum_size=1024) == b"{}"
+
+    accepted = compression.packed_response(stored, encoding)
+    assert accepted.headers["content-encoding"] == encoding
+    assert compression.decompress(accepted.body, encoding) == body
+
+    refused = compression.packed_response(stored, "identity")
+    assert "content-encoding" not in refused.headers
+    assert refused.body == body
@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+import uuid
+
+import pytest
+from redis.exceptions import RedisError
+
+from src import app
+from src.db.main import get_read_session
+from src.db.redis import redis_client
+from src.watermarks import BOOKS, Watermark, book_key, watermarks
+
+WATERMARK = Watermark("1700000000000:3", datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+
+
+@pytest.fixture
+def watermark(monkeypatch):
+    async def get(*names, fallback=None):
+        return WATERMARK
+
+    monkeypatch.setattr(watermarks, "get", get)
+
+
+def test_current_copies_are_not_sent_again(sqlite_client, watermark):
+    client, _, _, queries = sqlite_client
+
+    response = client.get("/api/v1/tags/", headers={"Accept-Encoding": "gzip"})
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+    assert response.status_code == 200
+    assert etag == '"1700000000000:3-gzip"'
+    assert last_modified == "Tue, 02 Jan 2024 03:04:05 GMT"
+
+    queries.reset()
+    for headers in (
+        {"If-None-Match": etag},
+        {"If-None-Match": f'"stale", W/{etag}'},
+        {"If-Modified-Since": last_modified},
+    ):
+        not_modified = client.get("/api/v1/tags/", headers={"Accept-Encoding": "gzip", **headers})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+    assert queries.count == 0
+
+    # If-None-Match wins over If-Modified-Since, and the tag covers the encoding
+    for headers in (
+        {"If-None-Match": '"stale"', "If-Modified-Since": last_modified},
+        {"If-None-Match": etag, "Accept-Encoding": "identity"},
+        {"If-Modified-Since": "Tue, 02 Jan 2024 03:04:04 GMT"},
+    ):
+        assert client.get("/api/v1/tags/", headers={"Accept-Encoding": "gzip", **headers}).status_code == 200
+
+
+def test_no_validators_without_a_watermark(sqlite_client, monkeypatch):
+    client, _, _, _ = sqlite_client
+
+    async def get(*names, fallback=None):
+        return None
+
+    monkeypatch.setattr(watermarks, "get", get)
+    response = client.get("/api/v1/tags/", headers={"If-None-Match": "*"})
+
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+
+def test_replica_bodies_go_out_without_validators(sqlite_client, watermark):
+    client, sqlite_db, _, queries = sqlite_client
+
+    async def get_replica_session():
+        async with sqlite_db(info={"replica": True}) as session:
+            yield session
+
+    app.dependency_overrides[get_read_session] = get_replica_session
+    response = client.get("/api/v1/tags/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert "last-modified" not in response.headers
+
+    # a tag sent with a body from the primary still answers without queries
+    queries.reset()
+    not_modified = client.get("/api/v1/tags/", headers={"Accept-Encoding": "gzip", "If-None-Match": '"1700000000000:3-gzip"'})
+    assert not_modified.status_code == 304
+    assert queries.count == 0
+
+
+def test_only_writes_create_watermarks(test_client):
+    name = book_key(uuid.uuid4())
+    try:
+        test_client.portal.call(redis_client.delete, f"watermark:{name}")
+    except RedisError:
+        pytest.skip("needs a Redis at REDIS_URL")
+
+    # lookups for any uid are open to every client, so they must not add keys
+    assert test_client.portal.call(watermarks.get, name) is None
+    assert test_client.portal.call(redis_client.exists, f"watermark:{name}") == 0
+
+    test_client.portal.call(watermarks.bump, name)
+    first = test_client.portal.call(watermarks.get, name)
+    test_client.portal.call(watermarks.bump, name)
+
+    assert first is not None
+    assert test_client.portal.call(watermarks.get, name).version != first.version
+    test_client.portal.call(redis_client.delete, f"watermark:{name}")
+
+
+def test_books_watermark_stands_in_for_a_missing_book(test_client):
+    name = book_key(uuid.uuid4())
+    try:
+        test_client.portal.call(redis_client.delete, f"watermark:{name}")
+    except RedisError:
+        pytest.skip("needs a Redis at REDIS_URL")
+
+    test_client.portal.call(watermarks.bump, BOOKS)
+    books = test_client.portal.call(watermarks.get, BOOKS)
+    assert test_client.portal.call(lambda: watermarks.get(name, fallback=BOOKS)) == books
+
+    test_client.portal.call(watermarks.bump, name, BOOKS)
+    own = test_client.portal.call(lambda: watermarks.get(name, fallback=BOOKS))
+    assert own == test_client.portal.call(watermarks.get, name)
+    assert own.version != books.version
+    test_client.portal.call(redis_client.delete, f"watermark:{name}")
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import date, datetime
+import uuid
+
+import pytest
+
+from src import fastjson
+from src.config import Config
+from src.db.models import Books, Tag
+
+
+def seed(session_factory, user_uid):
+    async def _seed():
+        async with session_factory() as session:
+            session.add_all([
+                Books(
+                    title="Ñandú “quoted” \\ back slash",
+                    author="Zoë",
+                    publisher="Éditions",
+                    published_date=date(1999, 12, 31),
+                    page_count=321,
+                    language="French",
+                    user_uid=user_uid,
+                    created_at=datetime(2024, 1, 1, 12, 0, 0, 123456),
+                    updated_at=datetime(2024, 1, 2),
+                    review_count=3,
+                    rating_sum=1,
+                    average_rating=1 / 3,
+                    rating_histogram={"0": 2, "1": 1},
+                ),
+                Books(
+                    title="plain",
+                    author="author",
+                    publisher="publisher",
+                    published_date=date(2020, 2, 29),
+                    page_count=1,
+                    language="English",
+                    user_uid=user_uid,
+                    created_at=datetime(2024, 1, 1),
+                    updated_at=datetime(2024, 1, 1),
+                ),
+            ])
+            session.add_all([Tag(name="fiction"), Tag(name="ünïcode", created_at=datetime(2023, 5, 6, 7, 8, 9, 1))])
+            await session.commit()
+
+    asyncio.run(_seed())
+
+
+@pytest.mark.parametrize("encoder", ["orjson", "stdlib"])
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/api/v1/books/",
+        "/api/v1/books/?sort=top_rated&limit=1",
+        "/api/v1/books/user/{user_uid}",
+        "/api/v1/tags/",
+    ],
+)
+def test_fast_responses_match_the_schemas(sqlite_client, monkeypatch, encoder, path):
+    client, session_factory, user, _ = sqlite_client
+    user_uid = uuid.uuid4()
+    seed(session_factory, user_uid)
+    path = path.format(user_uid=user_uid)
+
+    if encoder == "stdlib":
+        monkeypatch.setattr(fastjson, "orjson", None)
+    elif fastjson.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    monkeypatch.setattr(Config, "FAST_JSON_RESPONSES", False)
+    expected = client.get(path)
+    monkeypatch.setattr(Config, "FAST_JSON_RESPONSES", True)
+    fast = client.get(path)
+
+    assert expected.status_code == fast.status_code == 200
+    assert expected.json()["items"]
+    assert fast.content == expected.content
+    assert fast.headers["content-type"] == expected.headers["content-type"]
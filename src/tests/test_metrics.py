@@ -0,0 +1,24 @@
+from prometheus_client import REGISTRY
+
+
+def requests_seen(route: str, status: str) -> float:
+    labels = {"method": "GET", "route": route, "status": status}
+    return REGISTRY.get_sample_value("http_requests_total", labels) or 0.0
+
+
+def test_requests_are_counted_by_route_template(sqlite_client):
+    client, *_ = sqlite_client
+    before = requests_seen("/api/v1/books/user/{user_uid}", "200"), requests_seen("<unmatched>", "404")
+
+    client.get("/api/v1/books/user/7d1c6a9e-1f8b-4d0a-9a35-5b3e2f0c8d11")
+    client.get("/api/v1/books/user/0b6f3a52-8e0d-4c3e-a7f2-91d4c5e6b7a8")
+    client.get("/no/such/path")
+
+    after = requests_seen("/api/v1/books/user/{user_uid}", "200"), requests_seen("<unmatched>", "404")
+    assert after[0] - before[0] == 2
+    assert after[1] - before[1] == 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'route="/api/v1/books/user/{user_uid}"' in response.text
+    assert "7d1c6a9e" not in response.text
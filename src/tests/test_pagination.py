@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.db.models import Books
+from src.errors import InvalidCursor
+from src.pagination import PageParams, encode_cursor, paginate
+
+keys = (Books.created_at, Books.uid)
+
+
+def seed_books(session_factory, count):
+    async def _seed():
+        start = datetime(2024, 1, 1)
+        async with session_factory() as session:
+            for i in range(count):
+                # pairs of books share a timestamp so the uid tie-breaker matters
+                session.add(
+                    Books(
+                        title=f"book {i}",
+                        author="author",
+                        publisher="publisher",
+                        published_date=start.date(),
+                        page_count=100,
+                        language="English",
+                        created_at=start + timedelta(minutes=i // 2),
+                    )
+                )
+            await session.commit()
+
+    asyncio.run(_seed())
+
+
+def fetch_page(session_factory, cursor=None, limit=3):
+    async def _fetch():
+        async with session_factory() as session:
+            return await paginate(
+                session, Books, PageParams(cursor=cursor, limit=limit), keys=keys
+            )
+
+    return asyncio.run(_fetch())
+
+
+def test_pages_cover_every_row_once_in_order(sqlite_db):
+    seed_books(sqlite_db, 10)
+
+    seen = []
+    page = fetch_page(sqlite_db)
+    assert page.prev_cursor is None
+    seen.extend(page.items)
+
+    while page.next_cursor:
+        page = fetch_page(sqlite_db, page.next_cursor)
+        assert page.prev_cursor is not None
+        seen.extend(page.items)
+
+    assert len(seen) == 10
+    assert len({book.uid for book in seen}) == 10
+    assert seen == sorted(seen, key=lambda b: (b.created_at, b.uid), reverse=True)
+
+
+def test_prev_cursor_returns_previous_page(sqlite_db):
+    seed_books(sqlite_db, 7)
+
+    first = fetch_page(sqlite_db)
+    second = fetch_page(sqlite_db, first.next_cursor)
+    back = fetch_page(sqlite_db, second.prev_cursor)
+
+    assert [b.uid for b in back.items] == [b.uid for b in first.items]
+    assert back.prev_cursor is None
+    assert back.next_cursor is not None
+
+
+def test_malformed_cursor_is_rejected(sqlite_db):
+    with pytest.raises(InvalidCursor):
+        fetch_page(sqlite_db, "not-a-cursor")
+
+    with pytest.raises(InvalidCursor):
+        fetch_page(sqlite_db, encode_cursor(["2024-01-01T00:00:00"], "next"))
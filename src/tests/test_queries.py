@@ -0,0 +1,91 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from src.config import Config
+from src.db.accounting import QueryBudgetExceeded
+from src.db.models import Books, Review, Tag, User
+
+books_prefix = "/api/v1/books"
+
+
+def seed(session_factory, user):
+    async def _seed():
+        async with session_factory() as session:
+            reader = User(
+                username="reader",
+                email=user["email"],
+                first_name="Avid",
+                last_name="Reader",
+                password_hash="not-a-hash",
+                is_verified=True,
+            )
+            session.add(reader)
+            await session.flush()
+
+            books = []
+            for i in range(5):
+                book = Books(
+                    title=f"book {i}",
+                    author="author",
+                    publisher="publisher",
+                    published_date=date(2024, 1, 1),
+                    page_count=100,
+                    language="English",
+                    user_uid=reader.uid,
+                )
+                session.add(book)
+                books.append(book)
+            await session.flush()
+
+            for book in books:
+                for rating in range(3):
+                    session.add(
+                        Review(rating=rating, review_text="ok", user_uid=reader.uid, book_uid=book.uid)
+                    )
+            session.add(Tag(name="fiction"))
+            await session.commit()
+
+            user["user_uid"] = str(reader.uid)
+            return books[0].uid
+
+    return asyncio.run(_seed())
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        # list routes load no relationships: one statement for the page
+        (books_prefix + "/", 1),
+        (books_prefix + "/user/{user_uid}", 1),
+        ("/api/v1/tags/", 1),
+        ("/api/v1/reviews/", 1),
+        # detail routes batch each requested relationship into one statement
+        (books_prefix + "/{book_uid}", 2),
+        ("/api/v1/auth/me", 3),
+    ],
+)
+def test_queries_per_endpoint(sqlite_client, path, expected):
+    client, session_factory, user, queries = sqlite_client
+    book_uid = seed(session_factory, user)
+    queries.reset()
+
+    response = client.get(path.format(book_uid=book_uid, user_uid=user["user_uid"]))
+
+    assert response.status_code == 200
+    assert queries.count == expected
+
+
+def test_query_totals_are_reported_and_budgeted(sqlite_client, monkeypatch):
+    client, session_factory, user, _ = sqlite_client
+    seed(session_factory, user)
+    path = f"{books_prefix}/user/{user['user_uid']}"
+
+    response = client.get(path)
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert 'desc="1 queries,' in response.headers["server-timing"]
+
+    monkeypatch.setattr(Config, "DB_QUERY_BUDGET", 0)
+    with pytest.raises(QueryBudgetExceeded):
+        client.get(path)
@@ -0,0 +1,51 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+import pytest
+from redis.exceptions import RedisError
+
+from src.config import Config
+from src.db.redis import redis_client
+from src.middleware import register_middleware
+from src.ratelimit import _client, parse_limit
+
+LOGIN = "/api/v1/auth/login"
+URL = "http://localhost" + LOGIN
+
+
+def test_parse_limit():
+    assert parse_limit("10/minute") == (10 / 60, 10)
+    assert parse_limit("5/ second") == (5.0, 5)
+
+
+@pytest.mark.parametrize("trusted, expected", [([], "testclient"), (["testclient"], "203.0.113.7")])
+def test_clients_behind_a_trusted_proxy_are_told_apart(monkeypatch, trusted, expected):
+    monkeypatch.setattr(Config, "TRUSTED_PROXIES", trusted)
+    proxied = FastAPI()
+    register_middleware(proxied)
+
+    @proxied.get("/client")
+    async def client(request: Request):
+        return _client(request)
+
+    response = TestClient(proxied, base_url="http://localhost").get(
+        "/client", headers={"X-Forwarded-For": "203.0.113.7"}
+    )
+    assert response.json() == expected
+
+
+def test_bursts_get_429_with_retry_after(test_client, monkeypatch):
+    try:
+        test_client.portal.call(redis_client.delete, f"ratelimit:{LOGIN}:ip:testclient", f"ratelimit:{LOGIN}:route")
+    except RedisError:
+        pytest.skip("needs a Redis at REDIS_URL")
+
+    monkeypatch.setattr(Config, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(Config, "RATE_LIMITS", {LOGIN: {"ip": "2/minute", "route": "100/second"}})
+
+    # the limit is checked before the body, so these never reach bcrypt
+    statuses = [test_client.post(URL, json={}).status_code for _ in range(3)]
+    assert statuses == [422, 422, 429]
+
+    response = test_client.post(URL, json={})
+    assert response.json()["error_code"] == "rate_limited"
+    assert 1 <= int(response.headers["retry-after"]) <= 30
@@ -0,0 +1,37 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from src import app, resources
+from src.config import Config
+from src.health.routers import ready
+
+
+def test_ready_only_between_warm_up_and_shutdown(monkeypatch):
+    warmed = []
+
+    async def refuse(engine):
+        raise ConnectionRefusedError("no database here")
+
+    async def step():
+        warmed.append(resources.readiness.ready)
+
+    monkeypatch.setattr(Config, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(resources, "warm_engine", refuse)
+    monkeypatch.setattr(resources, "warm_redis", step)
+    monkeypatch.setattr(resources, "warm_hash_executor", step)
+    monkeypatch.setattr(resources.readiness, "warmup", {})
+
+    with TestClient(app, base_url="http://localhost") as client:
+        response = client.get("/api/v1/health/ready")
+        assert response.status_code == 200
+        assert client.get("/api/v1/health/live").status_code == 200
+
+    # warm-up ran before readiness, and a failed step did not stop startup
+    assert warmed == [False, False]
+    warmup = response.json()["warmup"]
+    assert "ConnectionRefusedError" in warmup["db:primary"]
+    assert isinstance(warmup["redis"], float)
+
+    not_ready = asyncio.run(ready())
+    assert not_ready.status_code == 503
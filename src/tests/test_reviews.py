@@ -0,0 +1,33 @@
+import asyncio
+import uuid
+
+from src.db.models import Review, User
+from src.reviews.service import ReviewService
+
+
+def test_reviews_of_deleted_books_can_be_deleted(sqlite_db):
+    email = f"{uuid.uuid4()}@example.com"
+    user_uid, review_uid = uuid.uuid4(), uuid.uuid4()
+
+    async def seed():
+        async with sqlite_db() as session:
+            session.add(User(
+                uid=user_uid,
+                username="reader",
+                email=email,
+                first_name="Ada",
+                last_name="Reader",
+                password_hash="x",
+            ))
+            # deleting a book detaches its reviews
+            session.add(Review(uid=review_uid, rating=4, review_text="gone", user_uid=user_uid, book_uid=None))
+            await session.commit()
+
+    async def delete():
+        async with sqlite_db() as session:
+            await ReviewService().delete_review_to_from_book(review_uid, email, session)
+        async with sqlite_db() as session:
+            return await session.get(Review, review_uid)
+
+    asyncio.run(seed())
+    assert asyncio.run(delete()) is None
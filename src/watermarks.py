@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from fastapi import Depends, Request, Response, status
+from fastapi.exceptions import HTTPException
+from redis.exceptions import RedisError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.compression import ranked_encodings
+from src.config import Config
+from src.db.main import get_read_session, reads_primary
+from src.db.redis import redis_client
+
+BOOKS = "books"
+TAGS = "tags"
+
+# Every watermark is a hash of an epoch, a change counter and the time of
+# the last change. The epoch is set when the hash is created, so a
+# watermark that expired or was lost with Redis never repeats an old
+# version even though its counter starts again from zero.
+BUMP = """
+for _, key in ipairs(KEYS) do
+    redis.call('HSETNX', key, 'epoch', ARGV[1])
+    redis.call('HINCRBY', key, 'version', 1)
+    redis.call('HSET', key, 'modified', ARGV[2])
+    redis.call('EXPIRE', key, ARGV[3])
+end
+"""
+
+
+def book_key(book_uid) -> str:
+    return f"book:{book_uid}"
+
+
+def _key(name: str) -> str:
+    return f"watermark:{name}"
+
+
+@dataclass(frozen=True)
+class Watermark:
+    version: str
+    modified: datetime
+
+    def headers(self, accept_encoding: str) -> Dict[str, str]:
+        # the bytes sent depend on the encodings the client accepts, and a
+        # strong tag promises the same bytes, so the tag names them too
+        encodings = "+".join(ranked_encodings(accept_encoding)) or "identity"
+        return {
+            "ETag": f'"{self.version}-{encodings}"',
+            "Last-Modified": format_datetime(self.modified, usegmt=True),
+            "Cache-Control": "private, no-cache",
+            "Vary": "Accept-Encoding",
+        }
+
+
+def not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    """Whether the client's copy is current, per If-None-Match or, failing
+    that, If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return headers["ETag"] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have whole seconds
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+
+    return False
+
+
+class Watermarks:
+    """Cheap validators for cached representations, kept in Redis.
+
+    Writes bump the watermarks of what they changed after committing, next
+    to invalidating the response cache. Only a bump creates a watermark:
+    reads are open to anyone, for any uid, and must not grow Redis. Reads
+    return None when Redis cannot answer or a watermark has not been
+    bumped within WATERMARK_TTL, and the response then goes out without
+    validators.
+    """
+
+    def __init__(self) -> None:
+        self._bump = redis_client.register_script(BUMP)
+
+    async def bump(self, *names: str) -> None:
+        if not names:
+            return
+
+        now = time.time()
+        try:
+            await self._bump(
+                keys=[_key(name) for name in names],
+                args=[int(now * 1000), now, Config.WATERMARK_TTL],
+            )
+        except RedisError as e:
+            # validators issued before the write still match until the watermark expires
+            logging.error("watermark bump failed for %s: %s", ", ".join(names), e)
+
+    async def get(self, *names: str, fallback: Optional[str] = None) -> Optional[Watermark]:
+        """The combined watermark of `names`, or that of `fallback` if any
+        of them is missing, or None"""
+        keys = [*names, fallback] if fallback else list(names)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for name in keys:
+                    pipe.hmget(_key(name), "epoch", "version", "modified")
+                marks = await pipe.execute()
+        except RedisError as e:
+            logging.warning("watermark read failed: %s", e)
+            return None
+
+        if fallback:
+            marks, fallback_mark = marks[:-1], marks[-1:]
+            if any(epoch is None for epoch, _, _ in marks):
+                marks = fallback_mark
+
+        if any(epoch is None for epoch, _, _ in marks):
+            return None
+
+        # hashes left by the old read script may not have a counter yet
+        version = ".".join(f"{int(epoch)}:{int(counter or 0)}" for epoch, counter, _ in marks)
+        modified = max(float(mark) for _, _, mark in marks)
+
+        return Watermark(version, datetime.fromtimestamp(int(modified), timezone.utc))
+
+
+watermarks = Watermarks()
+
+
+def conditional(*names: str, fallback: Optional[str] = None) -> Callable:
+    """A dependency answering conditional GETs from the watermarks of `names`.
+
+    Names are formatted with the path parameters, e.g. "book:{book_uid}".
+    `fallback` names a coarser watermark bumped by every write to them,
+    used while theirs is missing. A client whose copy is current gets a
+    bodiless 304 before the route runs its queries; otherwise the
+    validators are returned for the route to send with its response.
+
+    The watermark is read before the route's queries, so validators may
+    only go out with a body at least as new: one read from the primary,
+    or from a cache filled from it. A replica behind the watermark would
+    pin an old body under the new validator, so the validators are set on
+    a route's model response only when its read session is the primary,
+    and a route building its own response checks `reads_primary` itself.
+    """
+
+    async def dependency(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_read_session),
+    ) -> Dict[str, str]:
+        watermark = await watermarks.get(
+            *[name.format(**request.path_params) for name in names], fallback=fallback
+        )
+        if watermark is None:
+            return {}
+
+        headers = watermark.headers(request.headers.get("accept-encoding", ""))
+        if not_modified(request, headers):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if reads_primary(session):
+            response.headers.update(headers)
+        return headers
+
+    return dependency